@@ -1,15 +1,31 @@
 """5¼'-disk"""
 import argparse
+import collections
 import dataclasses
 import datetime
+import functools
+import io
+import itertools
+import json
 import math
 import os
 import pathlib
+import sys
 import time
 from abc import abstractmethod, ABC
 from argparse import ArgumentError
-from typing import Optional, Generator, TypeAlias, Self, Any, Sequence
-from collections.abc import Iterator
+from typing import Optional, Generator, TypeAlias, Self, Any, Sequence, BinaryIO, Collection
+from collections.abc import Iterator, Iterable
+
+import instrument
+import pcarch
+
+hashlib = pcarch.lazy_import("hashlib")
+http_server = pcarch.lazy_import("http.server")
+random = pcarch.lazy_import("random")
+tarfile = pcarch.lazy_import("tarfile")
+threading = pcarch.lazy_import("threading")
+url_parse = pcarch.lazy_import("urllib.parse")
 
 Sector_sz = 0x200
 Cylinders = 40
@@ -25,6 +41,12 @@ Fat_Sectors = (1, 1, 2, 2)
 Cluster_Sectors = (2, 1, 2, 1)  # physical sectors in a virtual cluster
 Root_Dir_Entries = (0x70, 0x40, 0x70, 0x40)
 Dir_Entry_sz = 0x20
+System_Fili = ("IBMBIO.COM", "IBMDOS.COM", "COMMAND.COM")  # in the order they must sit on a bootable disk
+Boot_Mask = slice(3, 0x3E)  # OEM name and BPB, that differ between copies of the same loader
+Boot_Messages = (b"NON-SYSTEM DISK", b"DISK BOOT FAILURE", b"FATAL DISK ERROR", b"IBMBIO  COM")
+Boot_Prints_Path = pathlib.Path(__file__).parent.parent / "doc" / "boot prints.json"
+Sketch_Bands, Sketch_Rows = 8, 4  # sketches agreeing on all rows of any band are compared
+Sketch_Prime = (1 << 61) - 1
 
 
 @dataclasses.dataclass
@@ -48,10 +70,10 @@ class FileEntry:
 
     @staticmethod
     def from_image(file: bytes, physical_index: int):
-        name = str(file[:8], encoding="ansi").upper().strip()
-        ext = str(file[8:0xB], encoding="ansi").upper().strip()
-        hidden = bool(file[0xB] | 2)
-        system_file = bool(file[0xB] | 4)
+        name = str(file[:8], encoding="cp437").upper().strip()
+        ext = str(file[8:0xB], encoding="cp437").upper().strip()
+        hidden = bool(file[0xB] & 2)
+        system_file = bool(file[0xB] & 4)
         create_datetime = datetime.datetime(**ms_time(file[0xE:0x10]), **ms_date(file[0x10:0x12]))
         access_date = datetime.date(**ms_date(file[0x12:0x14]))
         write_datetime = datetime.datetime(**ms_time(file[0x16:0x18]), **ms_date(file[0x18:0x1A]))
@@ -65,8 +87,8 @@ class FileEntry:
         return f"{self.name}.{self.ext}"
 
     def to_image(self) -> bytes:
-        back = "{:<8}".format(self.name[:8]).encode("ansi")
-        back += "{:<3}".format(self.ext[:3]).encode("ansi")
+        back = "{:<8}".format(self.name[:8]).encode("cp437")
+        back += "{:<3}".format(self.ext[:3]).encode("cp437")
         back += (2*self.hidden + 4*self.system_file).to_bytes(1)
         back += b'\0' * 2
         back += to_ms_time(self.create_datetime)
@@ -86,20 +108,25 @@ file_desc_t: TypeAlias = tuple[FileEntry, loc_t]
 
 
 class Disk:
+    class ReadError(Exception):
+        pass
+
     class OutOfSpace(Exception):
         pass
 
     def __init__(self, scroll_nom: str | os.PathLike, read_only: bool = True):
         self.read_only = read_only
         self.path = pathlib.Path(scroll_nom)
-        self.img = img = Image.from_file(self.path)
-        self.struct = struct = DiskStruct(img[1][0])
-        fat = img.part_get(Reserved_Sectors, struct.second_fat_floor)
-        assert fat() == img[struct.second_fat_floor: struct.root_dir_floor]
-        self.fat = Fat12(fat, struct.fat_entrys)
-        root_dir = img.part_get(struct.root_dir_floor, struct.files_floor)
-        self.root_dir = Directory(root_dir, self.struct.root_dir_entries)
-        self.fili_img = self.img.part_get(self.struct.files_floor)
+        with instrument.phase("open"):
+            self.img = img = Image.from_file(self.path)
+            self.struct = struct = DiskStruct(img[1][0])
+            fat = img.part_get(Reserved_Sectors, struct.second_fat_floor)
+            assert fat() == img[struct.second_fat_floor: struct.root_dir_floor]
+            self.fat = Fat12(fat, struct.fat_entrys)
+            root_dir = img.part_get(struct.root_dir_floor, struct.files_floor)
+            self.root_dir = Directory(root_dir, self.struct.root_dir_entries)
+            self.fili_img = self.img.part_get(self.struct.files_floor)
+        self._drive: Optional[Drive] = None
 
     @property
     def boot(self) -> bytes:
@@ -121,25 +148,64 @@ class Disk:
         self._file_extract_internal(self.path.parent, entry, loc)
 
     def fili_extract(self, loci: Optional[list[loc_t]] = None):
-        descri = self.fili_describe(loci)
-        folder = self.path.parent / self.path.stem
-        try:
-            os.mkdir(folder)
-        except FileExistsError:
-            pass
-        for couple in descri:
-            self._file_extract_internal(folder, *couple)
+        with instrument.phase("extract"):
+            descri = self.fili_describe(loci)
+            folder = self.path.parent / self.path.stem
+            try:
+                os.mkdir(folder)
+            except FileExistsError:
+                pass
+            for couple in descri:
+                self._file_extract_internal(folder, *couple)
 
     def fili_describe(self, loci: Optional[list[loc_t]] = None) -> Iterator[file_desc_t]:
         loci = loci or self.fat.fili_locate()[0]
         return ((self.root_dir[loc[0]], loc) for loc in loci)
 
+    def entry_locate(self, entry: FileEntry) -> loc_t:
+        """
+        :return: the entry's clusters, none for an empty file
+        """
+        if not entry.first_cluster:
+            return []
+        try:
+            return self.fat.file_locate(entry.first_cluster)
+        except StopIteration:  # past the end of the FAT, and no generator of entries may let it through
+            raise Fat.ReadError(0xFF7, [entry.first_cluster])
+
+    def entries_describe(self) -> Iterator[file_desc_t]:
+        """
+        :return: every entry of the directory with its clusters
+        """
+        return ((entry, self.entry_locate(entry)) for entry in self.root_dir())
+
     def file_get(self, file: loc_t, size: Optional[int] = None) -> bytes:
+        instrument.count("clusters_read", len(file))
         clusteri = (self.fili_img[self.cluster_slice_get(i)] for i in file)
         byti = b"".join(b"".join(cluster) for cluster in clusteri)
         byti = byti[:size] if size else byti.strip(b"\xF6").strip(b"\x00")
         return byti
 
+    def file_stream(self, file: loc_t, size: int) -> Iterator[bytes]:
+        """
+        :return: the file sector by sector, the last one cut to size
+        """
+        for i in file:
+            instrument.count("clusters_read")
+            for sector in self.fili_img[self.cluster_slice_get(i)]:
+                if size <= 0:
+                    return
+                yield sector[:size]
+                size -= Sector_sz
+
+    def tar_export(self, stream: BinaryIO, loci: Optional[list[loc_t]] = None):
+        with instrument.phase("export_tar"), tarfile.open(fileobj=stream, mode="w|") as tar:
+            for entry, loc in self.fili_describe(loci) if loci else self.entries_describe():
+                info = tarfile.TarInfo(entry.full_name)
+                info.size = entry.size
+                info.mtime = entry.write_datetime.timestamp()
+                tar.addfile(info, io.BufferedReader(ChunkStream(self.file_stream(loc, entry.size))))
+
     def cluster_slice_get(self, sect_ind: int) -> slice:
         this_cluster = sector_from_fat_loc(sect_ind, self.struct)
         next_cluster = this_cluster + self.struct.cluster_sects
@@ -172,44 +238,105 @@ class Disk:
             loc = ", ".join(loc)
             print(entry.full_name, loc)
 
+    def file_sectors(self, loc: loc_t) -> list[int]:
+        return [sector_from_fat_loc(p, self.struct) + self.struct.files_floor + i
+                for p in loc for i in range(self.struct.cluster_sects)]
+
+    def load_time_print(self, loci: Optional[list[loc_t]] = None, timing: Optional["DriveTiming"] = None):
+        timing = timing or DriveTiming()
+        fili = self.fili_describe(loci)
+        for entry, loc in fili:
+            sects = self.file_sectors(loc)[:math.ceil(entry.size / Sector_sz) or 1]
+            print(entry.full_name, "{:.1f} ms".format(timing.load_time(sects, self.struct)))
+
     def file_add(self, file_nom: str, system=False):
+        self.entry_add(entry_from_file(file_nom, self.root_dir.full_names), file_read(file_nom), system)
+
+    def entry_add(self, entry: FileEntry, sectors: Iterable[bytes], system=False):
+        """
+        :param sectors: the file's content, Sector_sz at a time. Not consumed if there isn't enough space.
+        """
         if self.read_only:
             raise Exception("Tried to write a file to disk opened in read-only mode")
-        if file_nom in self.root_dir.fili_names:
-            self.file_del(file_nom, flush=False)
+        if entry.full_name in (e.full_name for e in self.root_dir()):
+            self.file_del(entry.full_name, flush=False)
+        elif len(self.root_dir) >= self.struct.root_dir_entries:
+            raise Disk.OutOfSpace("No directory entry left for " + entry.full_name)
         empty = self.fat.fili_locate()[1]
-        allocated = []
-        sectors = list(file_read(file_nom))
-        sectors[-1] += b'\xf6' * (Sector_sz - len(sectors[-1]))
-        sectors += [b'\xf6' * Sector_sz] * (-len(sectors) % self.struct.cluster_sects)
-        for clust in range(0, len(sectors), self.struct.cluster_sects):
-            try:
-                pointer, empty = empty[0], empty[1:]
-            except IndexError as err:
-                raise Disk.OutOfSpace("Not enough space for "+file_nom) from err
-            allocated.append(pointer)
-            self.fili_img[self.cluster_slice_get(pointer)] = sectors[clust: clust + self.struct.cluster_sects]
+        clust_numb = math.ceil(entry.size / self.struct.cluster_sz)
+        if clust_numb > len(empty):
+            raise Disk.OutOfSpace("Not enough space for " + entry.full_name)
+        if not clust_numb:  # an empty file, at cluster 0 as DOS leaves it
+            self.root_dir.file_add(entry, 0, system)
+            self.img.flush()
+            return
+        allocated = empty[:clust_numb]
+        sectors = iter(sectors)
+        for pointer in allocated:
+            cluster = (next(sectors, b'') for _ in range(self.struct.cluster_sects))
+            cluster = [sector + b'\xf6' * (Sector_sz - len(sector)) for sector in cluster]
+            self.fili_img[self.cluster_slice_get(pointer)] = cluster
+        instrument.count("clusters_written", len(allocated))
         self.fat.file_add(allocated)
         self.sync_other_fats()
-        entry_size = self.root_dir.file_add(file_nom, allocated[0], system)
+        entry_size = self.root_dir.file_add(entry, allocated[0], system)
         assert (len(allocated) - self.struct.cluster_sects <=
                 entry_size // (Sector_sz * self.struct.cluster_sects) <= len(allocated))
         self.img.flush()
 
     def file_del(self, nom: str, flush=True):
         entry = self.root_dir[nom]
-        self.fat.file_del(entry.first_cluster)
-        self.sync_other_fats()
+        if entry.first_cluster:
+            self.fat.file_del(entry.first_cluster)
+            self.sync_other_fats()
         self.root_dir.file_del(entry)
         if flush: self.img.flush()
 
     def sync_other_fats(self):
+        instrument.count("fat_syncs")
         self.fat.img.flush()
         self.img[self.struct.second_fat_floor: self.struct.root_dir_floor] = self.fat.img[:]
 
     def format(self, codex_nom: str, fat_id: int):
         disk_format(self, codex_nom, fat_id)
 
+    def check(self) -> list[str]:
+        """
+        :return: fsck-style problems of the image, none for a healthy one
+        """
+        problems = []
+        if len(self.img) != self.struct.sector_numb:
+            problems.append(f"{len(self.img)} sectors instead of {self.struct.sector_numb}")
+        owners: dict[int, str] = {}
+        for entry in self.root_dir():
+            if not entry.first_cluster:
+                if entry.size:
+                    problems.append(f"{entry.full_name} has {entry.size} bytes and no cluster")
+                continue
+            try:
+                loc = self.fat.file_locate(entry.first_cluster)
+            except (Fat.ReadError, StopIteration):
+                problems.append(f"{entry.full_name} has a broken cluster chain")
+                continue
+            if len(loc) != max(1, math.ceil(entry.size / self.struct.cluster_sz)):
+                problems.append(f"{entry.full_name} has {entry.size} bytes in {len(loc)} clusters")
+            crossed = [p for p in loc if p in owners]
+            if crossed:
+                problems.append(f"{entry.full_name} is cross-linked with {owners[crossed[0]]}")
+            owners |= {p: entry.full_name for p in loc}
+        lost = [loc[0] for loc in self.fat.fili_locate()[0] if loc[0] not in owners]
+        if lost:
+            problems.append(f"lost chains from clusters {lost}")
+        return problems
+
+    def drive(self) -> "Drive":
+        if self._drive is None:
+            self._drive = Drive(self.img, self.struct, self.read_only)
+        return self._drive
+
+    def snapshot(self) -> "DiskSnapshot":
+        return DiskSnapshot(self)
+
 
 @dataclasses.dataclass
 class DiskStruct:
@@ -384,6 +511,8 @@ class Image(SeqWrapper):
 
     def flush(self):
         if self.file is None: return
+        instrument.count("flushes")
+        instrument.count("sectors_written", len(self._val))
         for sub in self.subscribers:
             sub.iner_flush()
         self.iner_flush()
@@ -509,6 +638,7 @@ class Fat(SeqWrapper):
     def file_locate(self, pointer: int) -> loc_t:
         raise StopIteration
 
+    @instrument.phase("locate")
     def fili_locate(self) -> tuple[list[loc_t], loc_t]:
         """
         :return: list of locs for all files + a loc of the empty clusters
@@ -582,14 +712,22 @@ class Fat12(Fat):
             self.image_update(loc, 0)
 
     def image_update(self, loc: int, value: int):
-        self.img.byte_seek_abs(loc * 3 // 2)
-        b = self.img.read(2, advance=False)
+        # an entry may straddle two sectors, so each byte is sought on its own
+        offset = loc * 3 // 2
+        self.img.byte_seek_abs(offset)
+        low = self.img.read(1)[0]
+        self.img.byte_seek_abs(offset + 1)
+        high = self.img.read(1)[0]
         if loc % 2:
-            self.img.write((b[0] % 0x10) +  0x10 * (value % 0x10))
-            self.img.write(value // 0x10)
+            low = (low % 0x10) + 0x10 * (value % 0x10)
+            high = value // 0x10
         else:
-            self.img.write(value % 0x100)
-            self.img.write((value // 0x100) + 0x10 * (b[1] // 0x10))
+            low = value % 0x100
+            high = (value // 0x100) + 0x10 * (high // 0x10)
+        self.img.byte_seek_abs(offset)
+        self.img.write(low)
+        self.img.byte_seek_abs(offset + 1)
+        self.img.write(high)
 
 
 class Directory(SeqWrapper):
@@ -618,11 +756,10 @@ class Directory(SeqWrapper):
             raise Directory.ReadError(err_massage)
         return entry
 
-    def file_add(self, file_nom: str, pointer: int, system=False) -> int:
-        entry = entry_from_file(file_nom)
-        entry.first_cluster = pointer
-        entry.hidden = entry.system_file = system
-        self.img.sect_buff()
+    def file_add(self, entry: FileEntry, pointer: int, system=False) -> int:
+        entry = dataclasses.replace(entry, first_cluster=pointer, hidden=entry.hidden or system,
+                                    system_file=entry.system_file or system)
+        self.img.byte_seek_abs(0)
         φ = 0
         while True:
             b = self.img.read(1, advance=False)
@@ -631,8 +768,8 @@ class Directory(SeqWrapper):
             else:
                 φ += 1
                 self.img.byte_seek_rel(0x20)
-        entry.physical_index = φ
         self.img.write(entry.to_image())
+        entry = FileEntry.from_image(entry.to_image(), φ)  # as written, times to the even second
         self._val.append(entry)
         return entry.size
 
@@ -656,6 +793,312 @@ class Directory(SeqWrapper):
     def fili_names(self) -> Iterator[str]:
         return (f.name for f in self._val)
 
+    @property
+    def full_names(self) -> set[str]:
+        return {f.full_name for f in self._val}
+
+
+class ChunkStream(io.RawIOBase):
+    """read() over an iterator of byte chunks"""
+    def __init__(self, chunks: Iterator[bytes]):
+        super().__init__()
+        self.chunks = chunks
+        self.rest = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        self.rest = self.rest or next(self.chunks, b'')
+        length = min(len(buffer), len(self.rest))
+        buffer[:length], self.rest = self.rest[:length], self.rest[length:]
+        return length
+
+
+class DiskSnapshot:
+    """
+    Read-only view of a disk as it was when taken. It keeps no cursors or buffers,
+    so any number of threads may read through one snapshot at once.
+    """
+    def __init__(self, disk: Disk):
+        self.path = disk.path
+        self.struct = disk.struct
+        self.sectors: tuple[bytes, ...] = tuple(disk.img())
+        fili = []
+        for entry in disk.root_dir():
+            try:
+                fili.append((dataclasses.replace(entry), tuple(disk.entry_locate(entry))))
+            except Fat.ReadError:
+                continue  # a broken chain, that Disk.check reports
+        self.fili: tuple[file_desc_t, ...] = tuple(fili)
+        self.names: dict[str, file_desc_t] = {}
+        for entry, loc in self.fili:
+            self.names.setdefault(entry.name, (entry, loc))
+            self.names[entry.full_name] = entry, loc
+
+    def __getitem__(self, nom: str) -> file_desc_t:
+        try:
+            return self.names[nom.upper()]
+        except KeyError:
+            raise Directory.ReadError(f"file {nom} doesn't exist")
+
+    def __iter__(self) -> Iterator[FileEntry]:
+        return (entry for entry, _ in self.fili)
+
+    def __len__(self) -> int:
+        return len(self.fili)
+
+    def cluster_get(self, pointer: int) -> bytes:
+        instrument.count("clusters_read")
+        floor = self.struct.files_floor + sector_from_fat_loc(pointer, self.struct)
+        return b''.join(self.sectors[floor: floor + self.struct.cluster_sects])
+
+    def file_get(self, nom: str) -> bytes:
+        entry, loc = self[nom]
+        return b''.join(self.cluster_get(p) for p in loc)[:entry.size]
+
+    def file_range(self, nom: str, offset: int, length: int) -> bytes:
+        """
+        :return: up to length bytes of the file from offset, reading only the clusters in range
+        """
+        entry, loc = self[nom]
+        stop = min(entry.size, offset + length)
+        if offset >= stop:
+            return b''
+        cluster_sz = self.struct.cluster_sz
+        first, last = offset // cluster_sz, (stop - 1) // cluster_sz
+        byti = b''.join(self.cluster_get(p) for p in loc[first: last + 1])
+        return byti[offset - first * cluster_sz: stop - first * cluster_sz]
+
+
+@dataclasses.dataclass
+class DriveTiming:
+    """Mechanical timings of a 5¼" drive, in milliseconds"""
+    step: float = 6  # track to track seek
+    settle: float = 15  # head settling after a seek
+    rpm: float = 300
+    interleave: int = 1
+    overhead: float = 0  # between finishing a sector and being ready for the next one
+
+    @property
+    def revolution(self) -> float:
+        return 60_000 / self.rpm
+
+    def slots(self, track_sects: int) -> list[int]:
+        """
+        :return: the rotational slot of each sector of a track, under the interleave
+        """
+        back = []
+        slot = 0
+        for _ in range(track_sects):
+            while slot in back:
+                slot = (slot + 1) % track_sects
+            back.append(slot)
+            slot = (slot + self.interleave) % track_sects
+        return back
+
+    def load_time(self, sects: Sequence[int], struct: DiskStruct, cylinder: int = 0) -> float:
+        """
+        :param sects: linear sectors in reading order
+        :param cylinder: where the head rests at the start, by default by the FAT and directory
+        """
+        slots = self.slots(struct.track_sects)
+        sector_time = self.revolution / struct.track_sects
+        t = 0.0
+        for sect in sects:
+            c, _, s = chs_from_sector(sect, struct)
+            if c != cylinder:
+                t += abs(c - cylinder) * self.step + self.settle
+                cylinder = c
+            position = t / sector_time % struct.track_sects
+            t += (slots[s - First_Physical_sector] - position) % struct.track_sects * sector_time
+            t += sector_time + self.overhead
+        return t
+
+
+class BootPrints:
+    """
+    Database of boot sectors by exact hash, by hash with Boot_Mask zeroed, and by the layout of the loader's messages.
+    Each lookup is a single dict access on sector 0 alone.
+    """
+    def __init__(self, path: str | os.PathLike = Boot_Prints_Path):
+        self.path = pathlib.Path(path)
+        try:
+            with open(self.path) as file:
+                db = json.load(file)
+        except FileNotFoundError:
+            db = {}
+        self.exact: dict[str, str] = db.get("exact", {})
+        self.masked: dict[str, str] = db.get("masked", {})
+        self.layouts: dict[str, str] = db.get("layouts", {})
+
+    def identify(self, boot: bytes) -> tuple[Optional[str], str]:
+        """
+        :return: label, and what matched it
+        """
+        for kind, table, key in (("exact", self.exact, boot_hash),
+                                 ("masked", self.masked, boot_masked_hash),
+                                 ("layout", self.layouts, boot_layout)):
+            label = table.get(key(boot))
+            if label is not None:
+                return label, kind
+        return None, "unknown"
+
+    def learn(self, boot: bytes, label: str):
+        self.exact[boot_hash(boot)] = label
+        self.masked[boot_masked_hash(boot)] = label
+        layout = boot_layout(boot)
+        if layout:
+            self.layouts.setdefault(layout, label)
+
+    def save(self):
+        with open(self.path, "w") as file:
+            json.dump({"exact": self.exact, "masked": self.masked, "layouts": self.layouts}, file, indent=1)
+
+
+class DiskCache:
+    """LRU of disk snapshots by path, a snapshot is dropped once its file's mtime changes"""
+    def __init__(self, size: int = 0x40):
+        self.size = size
+        self.snapshots: collections.OrderedDict[pathlib.Path, tuple[int, DiskSnapshot]] = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __getitem__(self, path: pathlib.Path) -> DiskSnapshot:
+        mtime = os.stat(path).st_mtime_ns
+        with self.lock:
+            cached = self.snapshots.get(path)
+            if cached is not None and cached[0] == mtime:
+                self.snapshots.move_to_end(path)
+                return cached[1]
+        try:
+            snapshot = Disk(path).snapshot()
+        except Parse_Errors as err:
+            raise Disk.ReadError(f"{path.name}: {err!r}") from err
+        with self.lock:
+            self.snapshots[path] = mtime, snapshot
+            self.snapshots.move_to_end(path)
+            while len(self.snapshots) > self.size:
+                self.snapshots.popitem(last=False)
+        return snapshot
+
+
+class DiskRequestHandler:
+    """
+    GET /list?img=, /stat?img=&file=, /read?img=&file=&offset=&length= and /extract?img=&file=
+    with img relative to the served folder. list and stat answer in JSON, read and extract in raw bytes.
+    serve mixes it into http.server.BaseHTTPRequestHandler, so the tool starts without http.server.
+    """
+    root: pathlib.Path
+    cache: DiskCache
+
+    def do_GET(self):
+        url = url_parse.urlsplit(self.path)
+        query = {k: v[-1] for k, v in url_parse.parse_qs(url.query).items()}
+        try:
+            scroll = self.scroll_get(query["img"])
+            if url.path == "/list":
+                self.json_send([entry_to_json(e) for e in scroll])
+            elif url.path == "/stat":
+                entry, loc = scroll[query["file"]]
+                self.json_send(entry_to_json(entry) | {"clusters": loc})
+            elif url.path == "/read":
+                offset, length = int(query.get("offset", 0)), int(query.get("length", 1 << 32))
+                if offset < 0 or length < 0:
+                    raise ValueError(f"negative offset {offset} or length {length}")
+                self.bytes_send(scroll.file_range(query["file"], offset, length))
+            elif url.path == "/extract":
+                self.bytes_send(scroll.file_get(query["file"]))
+            else:
+                self.json_send({"error": f"no such request {url.path}"}, 404)
+        except (KeyError, ValueError) as err:
+            self.json_send({"error": f"bad request {err}"}, 400)
+        except (OSError, Directory.ReadError) as err:
+            self.json_send({"error": str(err)}, 404)
+        except (Disk.ReadError, Fat.ReadError) as err:
+            self.json_send({"error": f"unreadable image {err}"}, 422)
+
+    def scroll_get(self, nom: str) -> DiskSnapshot:
+        path = (self.root / nom).resolve()
+        if not path.is_relative_to(self.root):
+            raise FileNotFoundError(f"{nom} is outside the served folder")
+        return self.cache[path]
+
+    def json_send(self, value, code: int = 200):
+        self.bytes_send(json.dumps(value).encode(), code, "application/json")
+
+    def bytes_send(self, value: bytes, code: int = 200, content_type: str = "application/octet-stream"):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(value)))
+        self.end_headers()
+        self.wfile.write(value)
+
+
+class Drive:
+    """
+    INT 13h style sector service, addressed by cylinder, head and sector.
+    Reads are served from whole cached tracks; writes go to the image directly, bypassing the FAT and directory.
+    """
+    class SeekError(Exception):
+        pass
+
+    def __init__(self, img: Image, struct: DiskStruct, read_only: bool = True):
+        self.img = img
+        self.struct = struct
+        self.read_only = read_only
+        self.tracks: dict[int, bytes] = {}
+        img.subscribers.append(self)
+
+    def sector_get(self, cylinder: int, head: int, sector: int, count: int) -> int:
+        if not all((0 <= cylinder < Cylinders, 0 <= head < self.struct.head_numb,
+                    First_Physical_sector <= sector < First_Physical_sector + self.struct.track_sects)):
+            raise Drive.SeekError(f"No sector at CHS {cylinder}/{head}/{sector}")
+        sect = sector_from_chs(cylinder, head, sector, self.struct)
+        if sect + count > len(self.img):
+            raise Drive.SeekError(f"{count} sectors from CHS {cylinder}/{head}/{sector} run off the disk")
+        return sect
+
+    def track_get(self, track: int) -> bytes:
+        try:
+            return self.tracks[track]
+        except KeyError:
+            instrument.count("tracks_read")
+            floor = track * self.struct.track_sects
+            back = self.tracks[track] = b''.join(self.img[floor: floor + self.struct.track_sects])
+            return back
+
+    def read_sectors(self, cylinder: int, head: int, sector: int, count: int = 1) -> bytes:
+        sect = self.sector_get(cylinder, head, sector, count)
+        back = []
+        while count:
+            track, pl = divmod(sect, self.struct.track_sects)
+            length = min(count, self.struct.track_sects - pl)
+            back.append(self.track_get(track)[pl * Sector_sz: (pl + length) * Sector_sz])
+            sect += length
+            count -= length
+        return b''.join(back)
+
+    def write_sectors(self, cylinder: int, head: int, sector: int, value: bytes):
+        """
+        :param value: the sectors' content, a last partial sector is padded with 0
+        """
+        if self.read_only:
+            raise Exception("Tried to write sectors to disk opened in read-only mode")
+        value += b'\0' * (-len(value) % Sector_sz)
+        count = len(value) // Sector_sz
+        if not count:
+            return
+        sect = self.sector_get(cylinder, head, sector, count)
+        self.img[sect: sect + count] = [value[i: i + Sector_sz] for i in range(0, len(value), Sector_sz)]
+        for track in range(sect // self.struct.track_sects, (sect + count - 1) // self.struct.track_sects + 1):
+            self.tracks.pop(track, None)
+
+    def iner_flush(self):
+        self.tracks.clear()
+
+    def flush(self):
+        self.img.flush()
+
 
 class FatIDError(Exception):
     def __init__(self, fat_id):
@@ -663,6 +1106,9 @@ class FatIDError(Exception):
         super().__init__(message)
 
 
+Parse_Errors = (AssertionError, FatIDError, Fat.ReadError, IndexError, UnicodeDecodeError, ValueError)  # of bad images
+
+
 def disk_factory(scroll_nom: str | os.PathLike) -> image_t:
     with open(scroll_nom, "br") as file:
         scroll = file.read()
@@ -671,6 +1117,7 @@ def disk_factory(scroll_nom: str | os.PathLike) -> image_t:
     while scroll:
         sector, scroll = scroll[:Sector_sz], scroll[Sector_sz:]
         disk.append(sector)
+    instrument.count("sectors_read", len(disk))
     return disk
 
 
@@ -711,7 +1158,7 @@ def ms_time(call: bytes) -> dict[str, int]:
 
 def ms_date(call: bytes) -> dict[str, int]:
     return {'day'  : (call[0] % 0x20) or 1,  # 0..5
-            'month': (call[0] // 0x20 + 8 * call[1] % 2) or 1,  # 5..9
+            'month': (call[0] // 0x20 + 8 * (call[1] % 2)) or 1,  # 5..9
             'year' : 1980 + call[1] // 2}  # 9..16
 
 
@@ -733,13 +1180,14 @@ def to_ms_time(call: datetime.datetime | datetime.date) -> bytes:
 def dir_factory(dir_img: image_t) -> dir_t:
     folder = []
     for pl, sector in enumerate(dir_img):
-        while sector:
-            entry, sector = sector[:Dir_Entry_sz], sector[Dir_Entry_sz:]
+        sector_floor = pl * Sector_sz // Dir_Entry_sz
+        for entry_pl in range(Sector_sz // Dir_Entry_sz):
+            entry = sector[entry_pl * Dir_Entry_sz: (entry_pl + 1) * Dir_Entry_sz]
             if entry[0] == 0xe5:
                 continue
             elif entry[0] == 0:
                 break
-            folder.append(FileEntry.from_image(entry, pl))
+            folder.append(FileEntry.from_image(entry, sector_floor + entry_pl))
         else:
             continue
         break
@@ -754,6 +1202,16 @@ def fat_loc_from_sector(sect: int, struct: DiskStruct) -> int:
     return sect // struct.cluster_sects + Fat_Offset
 
 
+def sector_from_chs(cylinder: int, head: int, sector: int, struct: DiskStruct) -> int:
+    return (cylinder * struct.head_numb + head) * struct.track_sects + sector - First_Physical_sector
+
+
+def chs_from_sector(sect: int, struct: DiskStruct) -> tuple[int, int, int]:
+    track, sector = divmod(sect, struct.track_sects)
+    cylinder, head = divmod(track, struct.head_numb)
+    return cylinder, head, sector + First_Physical_sector
+
+
 def loc_list_to_ranges(loci: loc_t) -> list[tuple[int, int]]:
     back = []
     start = loci[0]
@@ -768,17 +1226,51 @@ def loc_list_to_ranges(loci: loc_t) -> list[tuple[int, int]]:
 
 def file_read(file_nom: str) -> Generator[bytes, Any, None]:
     with open(file_nom, mode="rb") as file:
-        while sector := file.read(Sector_sz):
-            yield sector
+        yield from stream_read(file)
+
+
+def stream_read(stream: BinaryIO) -> Generator[bytes, Any, None]:
+    while sector := stream.read(Sector_sz):
+        yield sector
 
 
-def entry_from_file(file_nom: str) -> FileEntry:
-    basename = os.path.basename(file_nom)
-    basename, _, ext = basename.partition(".")
-    create_second = os.path.getctime(file_nom)
-    access_second = os.path.getatime(file_nom)
-    write_second = os.path.getmtime(file_nom)
-    time_structi = tuple(time.localtime(second) for second in (create_second, access_second, write_second))
+def entry_from_file(file_nom: str, taken: Collection[str] = ()) -> FileEntry:
+    secondi = os.path.getctime(file_nom), os.path.getatime(file_nom), os.path.getmtime(file_nom)
+    size = os.path.getsize(file_nom)
+    if not size:
+        with open(file_nom, "r") as file:
+            file.seek(0, 2)
+            size = file.tell()
+    return entry_from_times(os.path.basename(file_nom), secondi, size, taken)
+
+
+def entry_from_tarinfo(info: "tarfile.TarInfo", taken: Collection[str] = ()) -> FileEntry:
+    return entry_from_times(os.path.basename(info.name), (info.mtime,) * 3, info.size, taken)
+
+
+def short_name(basename: str, taken: Collection[str] = ()) -> tuple[str, str]:
+    """
+    :param taken: full names already in the directory
+    :return: name and extension cut to 8.3; a cut name that is taken ends in ~N instead
+    """
+    long_name, _, long_ext = basename.upper().partition(".")
+    name, ext = long_name[:8], long_ext[:3]
+    if (name, ext) == (long_name, long_ext):
+        return name, ext
+    for n in itertools.count(1):
+        if f"{name}.{ext}" not in taken:
+            return name, ext
+        name = long_name[:8 - len(f"~{n}")] + f"~{n}"
+
+
+def entry_from_times(basename: str, secondi: tuple[float, float, float], size: int,
+                     taken: Collection[str] = ()) -> FileEntry:
+    """
+    :param secondi: create, access and write times, in seconds since the epoch
+    :param taken: see short_name
+    """
+    basename, ext = short_name(basename, taken)
+    time_structi = tuple(time.localtime(second) for second in secondi)
     yeari = tuple((1980 +  (s.tm_year + 4) % 16) for s in time_structi)
     # the modal 16 year since 1980. 1980 is 12 in mode 16, so we need to add 4,
     # to put the year in the right place in the cycle.
@@ -788,14 +1280,118 @@ def entry_from_file(file_nom: str) -> FileEntry:
     create_datetime = datetime.datetime(yeari[0], *create_datetime)
     access_date = datetime.date(yeari[1], time_structi[1].tm_mon, time_structi[1].tm_mday)
     write_datetime = datetime.datetime(yeari[2], *write_datetime)
-    size = os.path.getsize(file_nom)
-    if not size:
-        with open(file_nom, "r") as file:
-            file.seek(0, 2)
-            size = file.tell()
     return FileEntry(basename, ext, create_datetime, access_date, write_datetime, 0, size, 0)
 
 
+def boot_read(scroll_nom: str | os.PathLike) -> bytes:
+    with open(scroll_nom, "rb") as file:
+        return file.read(Sector_sz)
+
+
+def boot_hash(boot: bytes) -> str:
+    return hashlib.sha1(boot).hexdigest()
+
+
+def boot_masked_hash(boot: bytes) -> str:
+    mask = Boot_Mask.stop - Boot_Mask.start
+    return hashlib.sha1(boot[:Boot_Mask.start] + b'\0' * mask + boot[Boot_Mask.stop:]).hexdigest()
+
+
+def boot_layout(boot: bytes) -> str:
+    """
+    :return: the offsets of the loader's messages, such as "NON-SYSTEM DISK@11D;IBMBIO  COM@18B"
+    """
+    boot = boot.upper()
+    layout = ((m, boot.find(m)) for m in Boot_Messages)
+    return ";".join(f"{m.decode()}@{offset:X}" for m, offset in layout if offset >= 0)
+
+
+def boot_oem(boot: bytes) -> str:
+    """
+    :return: the first run of printable text after the jump, where DOS 2 puts the OEM name, and CDP its date
+    """
+    run = b''
+    for byte in boot[3:Boot_Mask.stop]:
+        if 0x20 <= byte < 0x7F:
+            run += bytes((byte,))
+        elif len(run) >= 4:
+            break
+        else:
+            run = b''
+    return run.decode().strip() if len(run) >= 4 else ""
+
+
+def image_sketch(scroll_nom: str | os.PathLike) -> tuple[int, ...]:
+    """
+    :return: MinHash of the image's sectors, each hashed together with its position.
+        Sectors of a single repeated byte, as formatting leaves them, are left out.
+    """
+    with open(scroll_nom, "rb") as file:
+        scroll = file.read()
+    sectors = (scroll[i: i + Sector_sz] for i in range(0, len(scroll), Sector_sz))
+    hashi = {int.from_bytes(hashlib.blake2b(pl.to_bytes(2, "little") + sector, digest_size=8).digest())
+             for pl, sector in enumerate(sectors) if sector.count(sector[0]) != len(sector)}
+    if not hashi:
+        return (Sketch_Prime,) * len(sketch_coefficients())
+    return tuple(min((a * h + b) % Sketch_Prime for h in hashi) for a, b in sketch_coefficients())
+
+
+@functools.cache
+def sketch_coefficients() -> tuple[tuple[int, int], ...]:
+    """
+    :return: a and b of each of the sketch's (a * h + b) % Sketch_Prime, seeded so sketches compare across runs
+    """
+    return tuple((random.Random(2 * i).randrange(1, Sketch_Prime), random.Random(2 * i + 1).randrange(Sketch_Prime))
+                 for i in range(Sketch_Bands * Sketch_Rows))
+
+
+def sketch_similarity(sketch: Sequence[int], other: Sequence[int]) -> float:
+    return sum(a == b for a, b in zip(sketch, other)) / len(sketch)
+
+
+def image_health(scroll_nom: str | os.PathLike) -> tuple[int, int]:
+    """
+    :return: number of problems found by Disk.check, an unreadable image counting worst, and number of files
+    """
+    try:
+        scroll = Disk(scroll_nom)
+    except Parse_Errors:
+        return 1 << 16, 0
+    return len(scroll.check()), len(scroll.root_dir)
+
+
+def images_cluster(paths: Iterable[pathlib.Path], threshold: float = 0.8) -> list[list[pathlib.Path]]:
+    """
+    Group near-identical images. Candidate pairs come from sketches sharing a band,
+    so images are never compared all against all.
+    :return: groups of more than one image, the healthiest, then the one with most files, first
+    """
+    sketchi = {path: image_sketch(path) for path in paths}
+    parents = {path: path for path in sketchi}
+
+    def root(path):
+        while parents[path] != path:
+            parents[path] = path = parents[parents[path]]
+        return path
+
+    buckets = collections.defaultdict(list)
+    for path, sketch in sketchi.items():
+        for band in range(Sketch_Bands):
+            buckets[band, sketch[band * Sketch_Rows: (band + 1) * Sketch_Rows]].append(path)
+    for bucket in buckets.values():
+        for path in bucket[1:]:
+            if root(path) != root(bucket[0]) and sketch_similarity(sketchi[path], sketchi[bucket[0]]) >= threshold:
+                parents[root(path)] = root(bucket[0])
+    groups = collections.defaultdict(list)
+    for path in sketchi:
+        groups[root(path)].append(path)
+
+    def rank(path):
+        problems, files = image_health(path)
+        return problems, -files, str(path)
+    return [sorted(group, key=rank) for group in groups.values() if len(group) > 1]
+
+
 def blank_prefix(host: Disk, fat_id: int) -> bytes:
     if fat_id is None:
         codex_struct = host.struct
@@ -845,11 +1441,12 @@ def empty_disk(host: Disk, codex_nom: str, fat_id: int = None) -> Disk:
     return Disk(codex_nom, read_only=False)
 
 
+@instrument.phase("create")
 def folder_to_disk(host, codex_nom: str, fat_id: int):
     codex = empty_disk(host, codex_nom+".img", fat_id)
     codex_index = 0
     folder = [s.upper() for s in os.listdir(codex_nom)]
-    for file_nom in ("IBMBIO.COM", "IBMDOS.COM", "COMMAND.COM"):
+    for file_nom in System_Fili:
         file = os.path.join(codex_nom, file_nom)
         if os.path.isfile(file):
             codex.file_add(file, system=True)
@@ -865,15 +1462,154 @@ def folder_to_disk(host, codex_nom: str, fat_id: int):
             codex.file_add(file)
 
 
+@instrument.phase("optimize")
+def disk_optimize(host: Disk, codex_nom: str) -> Disk:
+    """
+    Rewrite host so every file is contiguous, with the system files first and then
+    the executables, largest first, on the tracks closest to the directory.
+    """
+    def rank(couple: file_desc_t) -> tuple[int, int]:
+        entry = couple[0]
+        if entry.full_name in System_Fili:
+            return 0, System_Fili.index(entry.full_name)
+        if entry.ext in {"COM", "EXE", "SYS"}:
+            return 1, -entry.size
+        return 2, 0
+
+    codex = empty_disk(host, codex_nom)
+    fili = sorted(host.entries_describe(), key=rank)
+    for entry, loc in fili:
+        codex.entry_add(entry, host.file_stream(loc, entry.size), entry.full_name in System_Fili)
+    return codex
+
+
+@instrument.phase("convert")
+def disk_convert(hosti: Iterable[Disk], codex_nom: str, fat_id: int) -> list[Disk]:
+    """
+    Copy every directory entry of all hosts, empty files included, sector by sector, into new disks of fat_id,
+    starting another one whenever a file doesn't fit or its name is taken.
+    The boot sector is the first host's.
+    """
+    hosti = iter(hosti)
+    first = next(hosti)
+    codexi = [empty_disk(first, codex_nom + ".img", fat_id)]
+    for host in itertools.chain((first,), hosti):
+        for entry, loc in host.entries_describe():
+            sectors = host.file_stream(loc, entry.size)
+            system = entry.full_name in System_Fili
+            try:
+                if entry.full_name in (e.full_name for e in codexi[-1].root_dir()):
+                    raise Disk.OutOfSpace(f"{entry.full_name} is already on {codexi[-1].path}")
+                codexi[-1].entry_add(entry, sectors, system)
+            except Disk.OutOfSpace:
+                codexi.append(empty_disk(first, f"{codex_nom}{len(codexi)}.img", fat_id))
+                codexi[-1].entry_add(entry, sectors, system)
+    return codexi
+
+
+def entry_to_json(entry: FileEntry) -> dict[str, str | int]:
+    return {"name": entry.full_name, "size": entry.size, "create": entry.create_datetime.isoformat(),
+            "access": entry.access_date.isoformat(), "write": entry.write_datetime.isoformat()}
+
+
+def serve(root: str | os.PathLike, port: int, cache_size: int = 0x40):
+    """Serve the images under root over HTTP on localhost, see DiskRequestHandler"""
+    handler = type("Handler", (DiskRequestHandler, http_server.BaseHTTPRequestHandler),
+                   {"root": pathlib.Path(root).resolve(), "cache": DiskCache(cache_size)})
+    with http_server.ThreadingHTTPServer(("127.0.0.1", port), handler) as server:
+        server.serve_forever()
+
+
+@instrument.phase("import_tar")
+def tar_to_disk(host, codex_nom: str, fat_id: Optional[int], stream: BinaryIO):
+    codex = empty_disk(host, codex_nom + ".img", fat_id)
+    codex_index = 0
+    with tarfile.open(fileobj=stream, mode="r|") as tar:
+        for info in tar:
+            if not info.isfile(): continue
+            entry = entry_from_tarinfo(info, codex.root_dir.full_names)
+            system = entry.full_name in System_Fili
+            sectors = stream_read(tar.extractfile(info))
+            try:
+                codex.entry_add(entry, sectors, system)
+            except Disk.OutOfSpace:
+                codex_index += 1
+                codex = empty_disk(host, f"{codex_nom}{codex_index}.img", fat_id)
+                codex.entry_add(entry, sectors, system)
+
+
 if __name__ == "__main__":
     def main():
         parser = argparse.ArgumentParser()
         parser.add_argument("action")
         parser.add_argument("scroll")
+        parser.add_argument("more", nargs="*", help="further images to convert along with scroll")
         parser.add_argument("-f", "--folder", default=None)
         parser.add_argument("-n", "--new", action="store_true")
+        parser.add_argument("-p", "--port", type=int, default=8013)
+        parser.add_argument("--fat-id", type=lambda v: int(v, 16), default=None)
+        parser.add_argument("--threshold", type=float, default=0.8, help="least similarity of clustered images")
+        parser.add_argument("--label", default=None, help="what to name learned boot sectors")
+        parser.add_argument("--prints", default=Boot_Prints_Path, help="boot sector fingerprint database")
+        parser.add_argument("--step", type=float, default=DriveTiming.step, help="timing track to track seek, in ms")
+        parser.add_argument("--settle", type=float, default=DriveTiming.settle, help="timing head settling, in ms")
+        parser.add_argument("--rpm", type=float, default=DriveTiming.rpm, help="timing drive speed")
+        parser.add_argument("--interleave", type=int, default=DriveTiming.interleave, help="timing sector interleave")
+        parser.add_argument("--stats", "--profile", action="store_true",
+                            help="print I/O counts and phase times as JSON to stderr")
         args = parser.parse_args()
         scroll = pathlib.Path(args.scroll)
+        if args.stats:
+            instrument.report_at_exit()
+
+        if args.action == "serve":
+            serve(scroll, args.port)
+            return
+        if args.action == "export-tar":
+            Disk(scroll).tar_export(sys.stdout.buffer)
+            return
+        if args.action == "import-tar":
+            codex_nom = args.folder or f"{scroll.parent / scroll.stem}-tar"
+            tar_to_disk(Disk(scroll), codex_nom, None, sys.stdin.buffer)
+            return
+
+        if args.action == "convert":
+            if args.fat_id is None:
+                raise ArgumentError(None, "convert needs a target --fat-id")
+            codex_nom = args.folder or f"{scroll.parent / scroll.stem}-{args.fat_id:X}"
+            hosti = [Disk(s) for s in (scroll, *args.more)]
+            codexi = disk_convert(hosti, codex_nom, args.fat_id)
+            for codex in codexi:
+                print(codex.path, len(codex.root_dir), "Files(s)")
+            print(f"{sum(len(c.root_dir) for c in codexi)} of {sum(len(h.root_dir) for h in hosti)} entries copied")
+            return
+        scrolli = (pathlib.Path(s) for s in (scroll, *args.more))
+        scrolli = (p for s in scrolli for p in (sorted(s.rglob("*.im?")) if s.is_dir() else (s,)))
+        if args.action == "cluster":
+            for group in images_cluster(scrolli, args.threshold):
+                print(f"*{group[0]}", *group[1:], sep="\t")
+            return
+        if args.action in {"identify", "learn"}:
+            prints = BootPrints(args.prints)
+            for path in scrolli:
+                boot = boot_read(path)
+                if args.action == "learn":
+                    prints.learn(boot, args.label or path.stem)
+                else:
+                    label, kind = prints.identify(boot)
+                    print(path, label, kind, boot_oem(boot), sep="\t")
+            if args.action == "learn":
+                prints.save()
+            return
+        timing = DriveTiming(args.step, args.settle, args.rpm, args.interleave)
+        if args.action == "timing":
+            Disk(scroll).load_time_print(timing=timing)
+            return
+        if args.action == "optimize":
+            codex_nom = args.folder or f"{scroll.parent / scroll.stem}-opt"
+            codex = disk_optimize(Disk(scroll), codex_nom + ".img")
+            codex.load_time_print(timing=timing)
+            return
 
         disk = Disk(scroll, read_only=False)
         fili, emp = disk.fat.fili_locate()
@@ -1,11 +1,29 @@
+from __future__ import annotations
+
 import argparse
+import dataclasses
+import functools
+import itertools
+import json
 import math
-import sys
+import mmap
+import os
+import pathlib
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import instrument
+import pcarch
 
-from PIL import Image
+futures = pcarch.lazy_import("concurrent.futures")
+np = pcarch.lazy_import("numpy")
+Image = pcarch.lazy_import("PIL.Image")
+ImageDraw = pcarch.lazy_import("PIL.ImageDraw")
+ImageFont = pcarch.lazy_import("PIL.ImageFont")
 
-BG = (0, 0, 0xAA)
-GLOBAL_INTENSITY = 0x55
+BG = 1  # blue
+PALLETES = {0: (2, 4, 6),  # mode 4 palette 0: green, red, brown
+            1: (3, 5, 7),  # mode 4 palette 1: cyan, magenta, white
+            5: (3, 4, 7)}  # mode 5: cyan, red, white
 FIELD_SZ = 0x2000
 LINE_PIX = 320
 LINE_SZ = LINE_PIX  // 4
@@ -15,26 +33,84 @@ LETTER_WIDTH = 8
 LETTER_HIGHT = 8
 ROW_WIDTH = ROW_LETTERS * LETTER_WIDTH
 ROW_BYTES = ROW_LETTERS * LETTER_HIGHT
+UNDRAWN = 4  # pixel index past the end of the data at 2 bpp, at any bpp it is 1 << bpp
+TEXT_COLUMNS = 80  # or 40
+BUILTIN_FONT_TOP = 3  # first row of PIL's default bitmap font to keep in a glyph
+# CP437 box drawing 0xB3-0xDA, as line weights (0 none, 1 single, 2 double) up, down, left and right
+BOX_DRAWING = ("1100 1110 1120 2210 0210 0120 2220 2200 0220 2020 2010 1020 0110 1001 1011 0111 1101 0011 1111 1102 "
+               "2201 2002 0202 2022 0222 2202 0022 2222 1022 2011 0122 0211 2001 1002 0102 0201 2211 1122 1010 0101")
+MODES = ("cg", "cg-p", "lm", "ft", "tx")  # batch modes, cg-p is progressive cg
+BSAVE_ID = 0xFD
+BSAVE_HEADER_SZ = 7
+AUTO_LINE_SZ = range(4, 161)  # candidate line sizes in bytes, 16 to 640 pixels
+STRIP_HIGHT = 256
+BSAVE_SEGMENT = 0xB800
+DISK_IMAGE_SUFFIXES = {".img", ".ima"}
+BSAVE_EOF = b'\x1A'
+BAYER = ((0, 8, 2, 10), (12, 4, 14, 6), (3, 11, 1, 9), (15, 7, 13, 5))  # ordered dither thresholds, in 16ths
+DITHER_SPREAD = 0x55  # the CGA intensity step
+DITHERS = ("none", "ordered", "diffusion")
+CARRIER_DOTS = 4  # 640 pixel dots a cycle of the NTSC color carrier
+YIQ_FROM_RGB = ((0.299, 0.587, 0.114), (0.596, -0.274, -0.322), (0.211, -0.523, 0.312))
+SCAN_BLOCK = 0x400
+SCAN_CHUNK = 0x1000 * SCAN_BLOCK
+SCAN_STRIDE = LINE_SZ
+SCAN_CG = 0.1  # how much more often edges go on a line below than 8 pixels aside, that marks graphics
+SCAN_FT = 0.4  # how much more often one row of 8 is blank than the typical row, that marks a font
+SCAN_GAP = 2  # blocks that may break a region, as a blank band in a picture
+SCAN_MAX_ENTROPY = 7.  # bits a byte, above which data is compressed or random
+SCAN_MAX_SYMBOL_ENTROPY = 1.95  # bits a 2-bit pixel, above which likewise
+TILE_LAYOUTS = ("linear", "screen")
+SHEET_TILES = 0x10  # tiles per row of a tile sheet
+THUMB_SZ = (160, 120)
+SHEET_COLUMNS = 8
+SHEET_LABEL = 12
 
 # CG hight is 205 lines
 
 
 def CGA_pallete(index: int) -> tuple[int, int, int]:
     index = index % 0x10
-    intensity = 0x55 * index // 8
+    if index == 6:
+        return 0xAA, 0x55, 0  # brown
+    intensity = 0x55 * (index // 8)
     return (0xAA * bool(index & 4) + intensity,
             0xAA * bool(index & 2) + intensity,
             0xAA * bool(index & 1) + intensity,
             )
 
 
-def CGA_mode4_pallete_1(index: int) -> tuple[int, int, int]:
+def CGA_mode4_pallete(index: int, pallete: int = 1, intense: bool = True, bg: int = BG) -> tuple[int, int, int]:
     index = index % 4
     if index == 0:
-        return BG
-    return (0xAA * bool(index & 2) + GLOBAL_INTENSITY,
-            0xAA * bool(index & 1) + GLOBAL_INTENSITY,
-            0xAA + GLOBAL_INTENSITY)
+        return CGA_pallete(bg)
+    return CGA_pallete(PALLETES[pallete][index - 1] + 8 * intense)
+
+
+@functools.cache
+def pallete_table(pallete: int = 1, intense: bool = True, bg: int = BG) -> list[int]:
+    """
+    :return: flat RGB entries for Image.putpalette, the 4 colors and then black for UNDRAWN
+    """
+    return [c for i in range(4) for c in CGA_mode4_pallete(i, pallete, intense, bg)] + [0, 0, 0]
+
+
+pallete_t = tuple[int, bool, int]  # palette, intense, background
+
+
+def pallete_variants() -> Iterator[pallete_t]:
+    return itertools.product(PALLETES, (False, True), range(0x10))
+
+
+def bpp_pallete(bpp: int, pallete: pallete_t = (1, True, BG)) -> list[int]:
+    """
+    :return: flat RGB entries for Image.putpalette, the 1 << bpp colors and then black for undrawn pixels
+    """
+    if bpp == 1:
+        return [0, 0, 0, 0xFF, 0xFF, 0xFF, 0, 0, 0]
+    elif bpp == 2:
+        return pallete_table(*pallete)
+    return text_pallete() + [0, 0, 0]
 
 
 def MDA_pallete(index: int) -> int:
@@ -42,130 +118,993 @@ def MDA_pallete(index: int) -> int:
     return 0xAA * bool(index & 2) + 0x55 * bool(index & 1)
 
 
-def draw_CG(call: bytes, width_pix, interlaced=True) -> Image.Image:
-    line_sz = math.ceil(width_pix / 4)
-    hight = math.ceil(len(call) / line_sz) + 1
-    image = Image.new("RGB", (width_pix, hight))
-    pixels = image.load()
+@functools.cache
+def unpack_table(bpp: int, msb_first: bool = True) -> np.ndarray:
+    """
+    :return: the pixels packed in each byte value, shape (0x100, 8 // bpp)
+    """
+    shifts = np.arange(0, 8, bpp)
+    if msb_first:
+        shifts = shifts[::-1]
+    return ((np.arange(0x100)[:, None] >> shifts) & ((1 << bpp) - 1)).astype(np.uint8)
+
+
+def unpack(call: bytes, bpp: int = 2, msb_first: bool = True) -> np.ndarray:
+    return unpack_table(bpp, msb_first)[np.frombuffer(call, np.uint8)].reshape(-1)
+
+
+def lines_unpack(call: bytes, line_sz: int, bpp: int = 2) -> np.ndarray:
+    """
+    :return: pixel indices, a line per line_sz bytes, the last line's tail undrawn
+    """
+    lines = math.ceil(len(call) / line_sz)
+    pixels = np.full(lines * line_sz * 8 // bpp, 1 << bpp, np.uint8)
+    pixels[:len(call) * 8 // bpp] = unpack(call, bpp)
+    return pixels.reshape(lines, line_sz * 8 // bpp)
+
+
+@dataclasses.dataclass(frozen=True)
+class GraphicsMode:
+    width: int
+    hight: int
+    bpp: int
+    banks: int
+    bank_sz: Optional[int] = None  # by default the dump is split evenly, the last bank taking the rest
+
+
+GRAPHICS_MODES = {"cga": GraphicsMode(320, 200, 2, 2, FIELD_SZ),
+                  "cga-hi": GraphicsMode(640, 200, 1, 2, FIELD_SZ),
+                  "herc": GraphicsMode(720, 348, 1, 4, 0x2000),
+                  "tandy": GraphicsMode(320, 200, 4, 4, 0x2000),  # also PCjr
+                  "tandy-lo": GraphicsMode(160, 200, 4, 2, 0x2000)}
+
+
+def banks_indices(call: bytes, width_pix: int, bpp: int = 2, banks: int = 2, bank_sz: Optional[int] = None,
+                  hight: Optional[int] = None) -> np.ndarray:
+    """
+    :param hight: by default, as many lines as the banks hold
+    :return: pixel indices, line i from bank i % banks
+    """
+    line_sz = math.ceil(width_pix * bpp / 8)
+    if bank_sz is None:
+        bank_sz = len(call) // banks
+        parts = [call[i * bank_sz: (i + 1) * bank_sz] for i in range(banks - 1)] + [call[(banks - 1) * bank_sz:]]
+    else:
+        parts = [call[i * bank_sz: (i + 1) * bank_sz] for i in range(banks)]
+    if hight is None:
+        hight = banks * max(math.ceil(len(part) / line_sz) for part in parts)
+    canvas = np.full((hight, line_sz * 8 // bpp), 1 << bpp, np.uint8)
+    for bank_i, part in enumerate(parts):
+        lines = lines_unpack(part, line_sz, bpp)
+        rows = canvas[bank_i::banks]
+        rows[:len(lines)] = lines[:len(rows)]
+    return canvas[:, :width_pix]
+
+
+def draw_banks(call: bytes, mode: GraphicsMode, pallete: pallete_t = (1, True, BG)) -> Image.Image:
+    indices = banks_indices(call, mode.width, mode.bpp, mode.banks, mode.bank_sz, mode.hight)
+    instrument.count("pixels_drawn", indices.size)
+    image = Image.fromarray(indices)
+    image.putpalette(bpp_pallete(mode.bpp, pallete))
+    return image
+
+
+def CG_indices(call: bytes, width_pix, interlaced=True) -> np.ndarray:
     # An interlaced file is made of lines which are devided into two fields.
     # The fields go sequentialy in both the file and the CGA screen
     # buffer, but are interleaved on the monitor.
-    if interlaced:
-        field_sz = len(call) // 2
-        fields = call[:field_sz], call[field_sz:]
-    else:
-        fields = (call,)
-    del call
-    for field_i, field in enumerate(fields):
-        lines = (field[y*line_sz:(y+1)*line_sz] for y in range(hight))
-        for y, line in enumerate(lines):
-            if interlaced:
-                y = 2 * y + field_i
-            for byte_i, byte in enumerate(line):
-                # each byte represents 4 pixels
-                pix_quad = byte >> 6, byte >> 4, byte >> 2, byte
-                pix_quad = (p & 3 for p in pix_quad)
-                for pixel_i, p in enumerate(pix_quad):
-                    x = 4 * byte_i + pixel_i
-                    try:
-                        pixels[x, y] = CGA_mode4_pallete_1(p)
-                    except IndexError:
-                        print(f"Error: draw to [{x}, {y}]")
+    hight = math.ceil(len(call) / math.ceil(width_pix / 4)) + 1
+    return banks_indices(call, width_pix, 2, 2 if interlaced else 1, hight=hight)
+
+
+def draw_CG(call: bytes, width_pix, interlaced=True, pallete: int = 1, intense: bool = True, bg: int = BG
+            ) -> Image.Image:
+    """
+    :return: a "P" image of the raw pixel indices, recolor it with pallete_table and putpalette
+    """
+    indices = CG_indices(call, width_pix, interlaced)
+    instrument.count("pixels_drawn", indices.size)
+    image = Image.fromarray(indices)
+    image.putpalette(pallete_table(pallete, intense, bg))
     return image
 
 
 def draw_2bit_font(call: bytes) -> Image.Image:
-    image = Image.new("L", (8, math.ceil(len(call) / 2)))
-    pixels = image.load()
-    for byte_i, byte in enumerate(call):
-        x = 4 * (byte_i % 2)
-        y = 2 * (byte_i // 2)
-        for pixel_i in range(4):
-            pixel = (byte >> 2 * pixel_i) & 3
-            try:
-                pixels[x + pixel_i, y] = MDA_pallete(pixel)
-            except IndexError:
-                print(f"Error: draw to [{x+pixel_i}, {y}]")
-    return image
+    # each pair of bytes is a line of 8 pixels, least significant first, drawn on every other row
+    hight = math.ceil(len(call) / 2)
+    lines = unpack(call + b'\0' * (len(call) % 2), 2, msb_first=False).reshape(-1, 8)
+    canvas = np.zeros((2 * hight, 8), np.uint8)
+    canvas[::2] = np.array([MDA_pallete(i) for i in range(4)], np.uint8)[lines]
+    instrument.count("pixels_drawn", 8 * hight)
+    return Image.fromarray(canvas[:hight])
 
 
 def draw_1bit_font(call: bytes) -> Image.Image:
-    return draw_w_costume_font(b'\r'.join((b''.join((ROW_LETTERS*j + i + 0x80).to_bytes(1) for i in range(ROW_LETTERS)))
-                                          for j in range(len(call)  // LETTER_WIDTH // ROW_LETTERS)),
-                               get_1bit_font(call))
+    font = get_1bit_font(call)
+    rows = max(1, math.ceil(len(font) / ROW_LETTERS))
+    atlas = np.zeros((rows * ROW_LETTERS, LETTER_HIGHT, LETTER_WIDTH), bool)
+    atlas[:len(font)] = font
+    pixels = np.zeros((rows * LETTER_HIGHT, LINE_PIX), bool)
+    pixels[:, :ROW_WIDTH] = atlas.reshape(rows, ROW_LETTERS, LETTER_HIGHT, LETTER_WIDTH).swapaxes(1, 2).reshape(
+        rows * LETTER_HIGHT, ROW_WIDTH)
+    instrument.count("pixels_drawn", pixels.size)
+    return Image.fromarray(pixels)
 
 
-font_t = list[Image.Image]
+font_t = "np.ndarray"  # glyphs, shape (n, LETTER_HIGHT, LETTER_WIDTH) of bool
 
 
 def get_1bit_font(call: bytes) -> font_t:
-    font = []
-    rows = (call[i * ROW_BYTES:(i + 1) * ROW_BYTES] for i in range(len(call)))
-    for row_i, row in enumerate(rows):
-        letters = (row[i * LETTER_HIGHT: (i + 1) * LETTER_HIGHT] for i in range(ROW_LETTERS))
-        for letter_i, letter in enumerate(letters):
-            image = Image.new("1", (LETTER_WIDTH, LETTER_HIGHT))
-            pixels = image.load()
-            for byte_i, byte in enumerate(letter):
-                y = byte_i
-                for pix_i in range(LETTER_WIDTH):
-                    x = pix_i
-                    try:
-                        pixels[x, y] = byte >> (7 - pix_i) & 1
-                    except IndexError:
-                        print(f"Error: draw to [{x}, {y}]")
-            font.append(image)
-    return font
+    """
+    :return: a glyph per 8 bytes, a row of pixels per byte, most significant first; the last glyph padded
+    """
+    call += b'\0' * (-len(call) % LETTER_HIGHT)
+    return np.unpackbits(np.frombuffer(call, np.uint8)).reshape(-1, LETTER_HIGHT, LETTER_WIDTH).astype(bool)
 
 
 def draw_w_costume_font(call: bytes, font: font_t) -> Image.Image:
-    lines = call.count(b'\r') + 1
-    line_letters = LINE_PIX / LETTER_WIDTH
-    image = Image.new("1", (LINE_PIX, lines * LETTER_HIGHT))
-    pixels = image.load()
-    row = col = 0
-    for byte in call:
-        if byte == ord(b'\r'):
-            row += 1
-            col = 0
-        elif byte < 0x80:
+    """
+    :param call: lines of glyph numbers + 0x80, separated by '\\r'; glyphs past the font are blank
+    """
+    lines = call.split(b'\r')
+    columns = LINE_PIX // LETTER_WIDTH
+    blank = len(font)
+    codes = np.full((len(lines), columns), blank)
+    for row, line in enumerate(lines):
+        line = np.frombuffer(line, np.uint8).astype(int)
+        if (line < 0x80).any():
             raise ValueError
-        else:
-            for letter_x in range(LETTER_WIDTH):
-                x = col * LETTER_HIGHT + letter_x
-                for letter_y in range(LETTER_HIGHT):
-                    y = row * LETTER_HIGHT + letter_y
-                    try:
-                        pixels[x, y] = font[byte - 0x80].getpixel((letter_x, letter_y))
-                    except IndexError:
-                        print(f"Error: draw to [{x}, {y}]")
-            col += 1
+        line = line[:columns] - 0x80
+        codes[row, :len(line)] = np.where(line < blank, line, blank)
+    atlas = np.concatenate((font, np.zeros((1, LETTER_HIGHT, LETTER_WIDTH), bool)))
+    pixels = atlas[codes].swapaxes(1, 2).reshape(len(lines) * LETTER_HIGHT, LINE_PIX)
+    instrument.count("pixels_drawn", pixels.size)
+    return Image.fromarray(pixels)
+
+
+def box_glyph(up: int, down: int, left: int, right: int) -> np.ndarray:
+    glyph = np.zeros((LETTER_HIGHT, LETTER_WIDTH), bool)
+    strokes = {1: (slice(3, 5),), 2: (slice(2, 4), slice(5, 7))}  # columns of vertical lines
+    for weight, rows in ((up, slice(0, 5)), (down, slice(3, 8))):
+        for columns in strokes.get(weight, ()):
+            glyph[rows, columns] = True
+    strokes = {1: (3,), 2: (2, 5)}  # rows of horizontal lines
+    for weight, columns in ((left, slice(0, 5)), (right, slice(3, 8))):
+        for row in strokes.get(weight, ()):
+            glyph[row, columns] = True
+    return glyph
+
+
+@functools.cache
+def builtin_font() -> font_t:
+    """
+    :return: 256 glyphs, printable ASCII rasterized from PIL's default bitmap font, and CP437 shades, blocks and
+        box drawing; the rest blank
+    """
+    font = np.zeros((0x100, LETTER_HIGHT, LETTER_WIDTH), bool)
+    pil_font = getattr(ImageFont, "load_default_imagefont", ImageFont.load_default)()  # before Pillow 10.1, the same
+    for code in range(0x21, 0x7F):
+        image = Image.new("1", (LETTER_WIDTH, BUILTIN_FONT_TOP + LETTER_HIGHT))
+        ImageDraw.Draw(image).text((1, 0), chr(code), font=pil_font, fill=1)
+        font[code] = np.asarray(image)[BUILTIN_FONT_TOP:]
+    y, x = np.indices((LETTER_HIGHT, LETTER_WIDTH))
+    font[0xB0] = x % 4 == y % 2 * 2  # light shade
+    font[0xB1] = (x + y) % 2 == 0  # medium shade
+    font[0xB2] = ~font[0xB0]  # dark shade
+    for code, weights in enumerate(BOX_DRAWING.split(), 0xB3):
+        font[code] = box_glyph(*map(int, weights))
+    font[0xDB] = True
+    font[0xDC, LETTER_HIGHT // 2:] = True
+    font[0xDD, :, :LETTER_WIDTH // 2] = True
+    font[0xDE, :, LETTER_WIDTH // 2:] = True
+    font[0xDF, :LETTER_HIGHT // 2] = True
+    return font
+
+
+@functools.lru_cache(maxsize=4)
+def text_tiles_cached(font: bytes, intense_bg: bool) -> np.ndarray:
+    glyphs = np.zeros((0x100, LETTER_HIGHT, LETTER_WIDTH), bool)
+    font = np.frombuffer(font, bool).reshape(-1, LETTER_HIGHT, LETTER_WIDTH)[:0x100]
+    glyphs[:len(font)] = font
+    attribute = np.arange(0x100)
+    fg = (attribute & 0xF).astype(np.uint8)
+    bg = (attribute >> 4 & (0xF if intense_bg else 7)).astype(np.uint8)
+    return np.where(glyphs[:, None], fg[None, :, None, None], bg[None, :, None, None]).reshape(
+        0x10000, LETTER_HIGHT, LETTER_WIDTH)
+
+
+def text_tiles(font: Optional[font_t] = None, intense_bg: bool = False) -> np.ndarray:
+    """
+    :param intense_bg: attribute bit 7 is background intensity rather than blink, which shows blinking cells lit
+    :return: the CGA_pallete indices of every character and attribute cell, indexed by character << 8 | attribute
+    """
+    font = builtin_font() if font is None else font
+    return text_tiles_cached(np.ascontiguousarray(font, bool).tobytes(), intense_bg)
+
+
+def text_indices(call: bytes, columns: int = TEXT_COLUMNS, font: Optional[font_t] = None, intense_bg: bool = False
+                 ) -> np.ndarray:
+    cells = np.frombuffer(call, np.uint8, len(call) // 2 * 2).reshape(-1, 2).astype(np.uint16)
+    rows = max(1, math.ceil(len(cells) / columns))
+    codes = np.zeros(rows * columns, np.uint16)
+    codes[:len(cells)] = cells[:, 0] << 8 | cells[:, 1]
+    return text_tiles(font, intense_bg)[codes.reshape(rows, columns)].swapaxes(1, 2).reshape(
+        rows * LETTER_HIGHT, columns * LETTER_WIDTH)
+
+
+def text_pallete() -> list[int]:
+    return [c for i in range(0x10) for c in CGA_pallete(i)]
+
+
+def draw_text(call: bytes, columns: int = TEXT_COLUMNS, font: Optional[font_t] = None, intense_bg: bool = False
+              ) -> Image.Image:
+    """
+    :param call: character and attribute byte pairs, as in the B800 text buffer; a full dump stacks its pages
+    """
+    pixels = text_indices(call, columns, font, intense_bg)
+    instrument.count("pixels_drawn", pixels.size)
+    image = Image.fromarray(pixels)
+    image.putpalette(text_pallete())
     return image
 
 
+def quantize(image: Image.Image, pallete: pallete_t = (1, True, BG), dither: str = "none") -> np.ndarray:
+    """
+    :param dither: none, nearest color; ordered, a 4x4 Bayer matrix; diffusion, Floyd-Steinberg
+    :return: the index of a color of the CGA palette for each pixel
+    """
+    colors = np.array(pallete_table(*pallete)[:12]).reshape(4, 3)
+    image = image.convert("RGB")
+    if dither == "diffusion":
+        pallete_image = Image.new("P", (1, 1))
+        pallete_image.putpalette(colors.reshape(-1).tolist() * 0x40)
+        return np.asarray(image.quantize(palette=pallete_image, dither=Image.Dither.FLOYDSTEINBERG)) % 4
+    pixels = np.asarray(image, np.int32)
+    if dither == "ordered":
+        hight, width = pixels.shape[:2]
+        thresholds = np.tile(np.array(BAYER) / 16 - 15 / 32, (hight // 4 + 1, width // 4 + 1))[:hight, :width, None]
+        pixels = pixels + (thresholds * DITHER_SPREAD).astype(np.int32)
+    elif dither != "none":
+        raise ValueError(f"no such dither {dither}")
+    distances = ((pixels[:, :, None] - colors) ** 2).sum(axis=-1)
+    return distances.argmin(axis=-1).astype(np.uint8)
+
+
+def pack(indices: np.ndarray, bpp: int = 2) -> np.ndarray:
+    """
+    :return: the lines of indices packed most significant first, each padded with 0 to whole bytes
+    """
+    per_byte = 8 // bpp
+    hight, width = indices.shape
+    padded = np.zeros((hight, -(-width // per_byte) * per_byte), np.uint8)
+    padded[:, :width] = indices
+    shifts = np.arange(8 - bpp, -1, -bpp, dtype=np.uint8)
+    return np.bitwise_or.reduce(padded.reshape(hight, -1, per_byte) << shifts, axis=-1).astype(np.uint8)
+
+
+def bsave_header(length: int, segment: int = BSAVE_SEGMENT, offset: int = 0) -> bytes:
+    return bytes((BSAVE_ID,)) + b''.join(n.to_bytes(2, "little") for n in (segment, offset, length))
+
+
+def encode_CG(image: Image.Image, interlaced: bool = True, pallete: pallete_t = (1, True, BG), dither: str = "none",
+              bsave: bool = True) -> bytes:
+    """
+    The reverse of draw_CG: 4 pixels a byte, and if interlaced the even lines and then the odd ones, each field padded
+    to FIELD_SZ if it fits in it
+
+    :param bsave: add the header and the end of file mark of BASIC's BSAVE, to load into the B800 segment
+    """
+    lines = pack(quantize(image, pallete, dither))
+    instrument.count("pixels_encoded", image.width * image.height)
+    if interlaced:
+        fields = lines[0::2].tobytes(), lines[1::2].tobytes()
+        field_sz = max(len(fields[0]), FIELD_SZ)
+        call = b''.join(field + b'\0' * (field_sz - len(field)) for field in fields)
+    else:
+        call = lines.tobytes()
+    if bsave:
+        call = bsave_header(len(call)) + call + BSAVE_EOF
+    return call
+
+
+def tile_bytes(call: bytes, tile_width: int, tile_hight: int, bpp: int = 2, layout: str = "linear",
+               line_length: int = LINE_PIX, interlaced: bool = True) -> tuple[np.ndarray, int]:
+    """
+    :param layout: linear, each tile's lines one after the other; screen, a grid cut from a line_length screen
+    :return: the bytes of each whole tile, one row per tile, and the columns of the grid (1 for linear)
+    """
+    tile_line_sz, rest = divmod(tile_width * bpp, 8)
+    if rest:
+        raise ValueError(f"{tile_width} pixels at {bpp} bpp is not whole bytes")
+    a = np.frombuffer(call, np.uint8)
+    if layout == "linear":
+        tile_sz = tile_line_sz * tile_hight
+        return a[:len(a) // tile_sz * tile_sz].reshape(-1, tile_sz), 1
+    if layout != "screen":
+        raise ValueError(f"no such layout {layout}")
+    line_sz = math.ceil(line_length * bpp / 8)
+    if interlaced:
+        half = len(a) // 2
+        fields = [field[:len(field) // line_sz * line_sz].reshape(-1, line_sz) for field in (a[:half], a[half:])]
+        lines = min(len(fields[0]), len(fields[1]))
+        rows = np.stack((fields[0][:lines], fields[1][:lines]), axis=1).reshape(-1, line_sz)
+    else:
+        rows = a[:len(a) // line_sz * line_sz].reshape(-1, line_sz)
+    grid_rows, columns = len(rows) // tile_hight, line_sz // tile_line_sz
+    grid = rows[:grid_rows * tile_hight, :columns * tile_line_sz].reshape(grid_rows, tile_hight, columns, tile_line_sz)
+    return grid.swapaxes(1, 2).reshape(-1, tile_hight * tile_line_sz), columns
+
+
+def tiles_dedupe(tiles: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    :return: the unique tiles in order of first appearance, and the unique number of each tile
+    """
+    if not len(tiles):
+        return tiles, np.zeros(0, int)
+    keys = np.ascontiguousarray(tiles).view(np.dtype((np.void, tiles.shape[1]))).reshape(-1)
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return tiles[first[order]], rank[inverse.reshape(-1)]
+
+
+def draw_tiles(tiles: np.ndarray, tile_width: int, tile_hight: int, bpp: int = 2,
+               pallete: pallete_t = (1, True, BG)) -> Image.Image:
+    """
+    :return: a sheet of the tiles, SHEET_TILES per row
+    """
+    rows = max(1, math.ceil(len(tiles) / SHEET_TILES))
+    pixels = np.zeros((rows * SHEET_TILES, tile_hight, tile_width), np.uint8)
+    pixels[:len(tiles)] = unpack_table(bpp)[tiles].reshape(len(tiles), tile_hight, tile_width)
+    pixels = pixels.reshape(rows, SHEET_TILES, tile_hight, tile_width).swapaxes(1, 2).reshape(
+        rows * tile_hight, SHEET_TILES * tile_width)
+    instrument.count("pixels_drawn", pixels.size)
+    image = Image.fromarray(pixels)
+    image.putpalette(bpp_pallete(bpp, pallete))
+    return image
+
+
+def entropy(counts: np.ndarray) -> np.ndarray:
+    """
+    :param counts: symbol occurrences, a row per block
+    :return: bits a symbol of each block
+    """
+    p = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    return -(p * np.log2(np.where(p > 0, p, 1))).sum(axis=1)
+
+
+def blocks_count(blocks: np.ndarray, symbols: int) -> np.ndarray:
+    n = len(blocks)
+    keys = blocks.astype(np.int64) + symbols * np.arange(n)[:, None]
+    return np.bincount(keys.reshape(-1), minlength=n * symbols).reshape(n, symbols)
+
+
+def scan_blocks(blocks: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    :param blocks: bytes, a row per block
+    :return: per block, the entropy of bytes and of 2-bit pixels, the edge score and the glyph score
+    """
+    # edges, bytes unlike the next, found again a line below; text repeats at any even stride, and so scores 0
+    span = blocks.shape[1] - SCAN_STRIDE - 2
+    edges = blocks[:, :span] != blocks[:, 1: span + 1]
+    edges_n = np.maximum(edges.sum(axis=1), 1)
+    alike = {lag: ((blocks[:, :span] == blocks[:, lag: span + lag]) & edges).sum(axis=1) / edges_n
+             for lag in (SCAN_STRIDE - 2, SCAN_STRIDE, SCAN_STRIDE + 2)}
+    glyphs = blocks.reshape(len(blocks), -1, LETTER_HIGHT)
+    drawn = glyphs.any(axis=2)
+    blank_rows = ((glyphs == 0) & drawn[:, :, None]).sum(axis=1) / np.maximum(drawn.sum(axis=1), 1)[:, None]
+    return {"entropy": entropy(blocks_count(blocks, 0x100)),
+            "symbol_entropy": entropy(blocks_count(unpack_table(2)[blocks].reshape(len(blocks), -1), 4)),
+            "edges": alike[SCAN_STRIDE] - (alike[SCAN_STRIDE - 2] + alike[SCAN_STRIDE + 2]) / 2,
+            "glyph": (blank_rows.max(axis=1) - np.median(blank_rows, axis=1)) * (drawn.mean(axis=1) > .5)}
+
+
+def scan_edge(alike: np.ndarray, inside: int, threshold: float) -> int:
+    """
+    :param alike: per unit, whether it is alike the region, which holds unit inside - 1
+    :return: the first unit of the region, where the units alike more often than threshold, up to inside, add most
+    """
+    gains = np.concatenate(([0], np.cumsum(alike[inside - 1::-1] - threshold))) if inside else np.zeros(1)
+    return inside - int(np.argmax(gains))
+
+
+def scan_refine(scroll: bytes, first: int, end: int, action: str) -> tuple[int, int]:
+    """
+    Refine a region of blocks to the byte for cg, whose bytes are alike a line aside, and to the glyph for ft, whose
+    glyphs are blank on one row; within the SCAN_GAP blocks about each edge, which may be as blank as a gap
+
+    :return: the region's first and end offset
+    """
+    lo, hi = max(first - SCAN_GAP * SCAN_BLOCK, 0), min(end + SCAN_GAP * SCAN_BLOCK, len(scroll))
+    if action == "ft":
+        unit = LETTER_HIGHT
+        glyphs = np.frombuffer(scroll[lo: hi - (hi - lo) % unit], np.uint8).reshape(-1, unit)
+        inner = glyphs[(first - lo) // unit: (end - lo) // unit]
+        row = int(np.argmax(((inner == 0) & inner.any(axis=1)[:, None]).sum(axis=0)))
+        below = above = glyphs[:, row] == 0
+    else:
+        unit = 1
+        ground = np.frombuffer(scroll[lo: hi], np.uint8)
+        alike, pad = ground[:-SCAN_STRIDE] == ground[SCAN_STRIDE:], np.zeros(SCAN_STRIDE, bool)
+        below, above = np.concatenate((alike, pad)), np.concatenate((pad, alike))
+    threshold = below[(first - lo) // unit: (end - lo) // unit].mean() / 2
+    start = lo + unit * scan_edge(below, (min(first + SCAN_BLOCK, end) - lo) // unit, threshold)
+    inside = len(above) - (max(end - SCAN_BLOCK, first) - lo) // unit
+    stop = lo + unit * (len(above) - scan_edge(above[::-1], inside, threshold))
+    return (start, stop) if start < stop else (first, end)
+
+
+def scan(path: str) -> list[tuple[int, int, str, float]]:
+    """
+    Look for CGA graphics and fonts in a file of any size, SCAN_BLOCK bytes at a time, then refine their edges
+
+    :return: regions of neighbouring blocks alike, as offset, size, suggested action (cg or ft) and score, best first
+    """
+    actions = ("", "cg", "ft")
+    kinds, scores = [], []
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size < SCAN_BLOCK:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as scroll:
+            for start in range(0, size // SCAN_BLOCK * SCAN_BLOCK, SCAN_CHUNK):
+                chunk = scroll[start: min(start + SCAN_CHUNK, size // SCAN_BLOCK * SCAN_BLOCK)]
+                stats = scan_blocks(np.frombuffer(chunk, np.uint8).reshape(-1, SCAN_BLOCK))
+                instrument.count("blocks_scanned", len(stats["glyph"]))
+                dense = (stats["entropy"] < SCAN_MAX_ENTROPY) & (stats["symbol_entropy"] < SCAN_MAX_SYMBOL_ENTROPY)
+                ft = stats["glyph"] > SCAN_FT
+                cg = ~ft & dense & (stats["edges"] > SCAN_CG)
+                kinds.append(cg * 1 + ft * 2)
+                scores.append(np.where(ft, stats["glyph"], stats["edges"]))
+            kinds, scores = np.concatenate(kinds), np.concatenate(scores)
+            bounds = np.flatnonzero(np.diff(kinds)) + 1
+            runs = []  # kind, first block, end block
+            for first, end in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(kinds)]))):
+                kind = int(kinds[first])
+                gap = len(runs) >= 2 and not runs[-1][0] and runs[-1][2] - runs[-1][1] <= SCAN_GAP
+                if gap and kind and runs[-2][0] == kind:
+                    runs.pop()
+                    first = runs.pop()[1]
+                runs.append((kind, int(first), int(end)))
+            regions = []
+            for kind, first, end in runs:
+                if kind:
+                    start, stop = scan_refine(scroll, first * SCAN_BLOCK, end * SCAN_BLOCK, actions[kind])
+                    regions.append((start, stop - start, actions[kind],
+                                    float(scores[first: end].mean() * math.sqrt(end - first))))
+    return sorted(regions, key=lambda region: -region[3])
+
+
+@functools.cache
+def composite_table(bpp: int = 2, pallete: pallete_t = (1, True, BG)) -> tuple[np.ndarray, int]:
+    """
+    A composite monitor sees each 640 pixel dot as a sample of the signal, and decodes a color out of the
+    CARRIER_DOTS dots around it, from the dot before. A color in a dot is its luminance plus its chroma at the phase
+    of the carrier there, so a solid color decodes as itself, while patterns finer than the carrier give artifact
+    colors.
+
+    :return: RGB by carrier phase and by window of pixels, their indices packed first pixel lowest, and the pixels
+        a window covers
+    """
+    dots = bpp  # a pixel's dots
+    window = CARRIER_DOTS // dots + (dots > 1)
+    rgb = np.array(bpp_pallete(bpp, pallete)[:3 << bpp]).reshape(-1, 3) / 0xFF
+    y, i, q = np.array(YIQ_FROM_RGB) @ rgb.T
+    phases = 2 * np.pi * np.arange(CARRIER_DOTS) / CARRIER_DOTS
+    signal = y[:, None] + i[:, None] * np.cos(phases) + q[:, None] * np.sin(phases)  # by color and phase
+    table = np.zeros((CARRIER_DOTS, 1 << bpp * window, 3), np.uint8)
+    patterns = np.arange(1 << bpp * window)
+    for phase in range(CARRIER_DOTS):
+        samples = []
+        for dot in range(phase - 1, phase - 1 + CARRIER_DOTS):
+            pixel = dot // dots - (phase - 1) // dots
+            samples.append(signal[patterns >> bpp * pixel & (1 << bpp) - 1, dot % CARRIER_DOTS])
+        samples, at = np.array(samples), phases[np.arange(phase - 1, phase - 1 + CARRIER_DOTS) % CARRIER_DOTS, None]
+        yiq = np.stack((samples.mean(axis=0), 2 * (samples * np.cos(at)).mean(axis=0),
+                        2 * (samples * np.sin(at)).mean(axis=0)))
+        table[phase] = np.clip(np.linalg.inv(YIQ_FROM_RGB) @ yiq * 0xFF + .5, 0, 0xFF).T
+    return table, window
+
+
+def composite_indices(indices: np.ndarray, bpp: int = 2, pallete: pallete_t = (1, True, BG)) -> np.ndarray:
+    """
+    :param indices: pixels at bpp, undrawn ones taken as color 0
+    :return: RGB a 640 pixel dot, as a composite monitor shows them
+    """
+    table, window = composite_table(bpp, pallete)
+    dots = bpp
+    indices = np.where(indices >> bpp, 0, indices).astype(np.intp)
+    hight, width = indices.shape
+    padded = np.zeros((hight, width + window + 1), np.intp)
+    padded[:, 1: width + 1] = indices
+    x = np.arange(width * dots)
+    first = (x - 1) // dots + 1  # in padded
+    codes = sum(padded[:, first + k] << bpp * k for k in range(window))
+    return table[x % CARRIER_DOTS, codes]
+
+
+def draw_composite(call: bytes, width_pix: int = LINE_PIX, interlaced: bool = True, bpp: int = 2,
+                   pallete: pallete_t = (1, True, BG)) -> Image.Image:
+    """
+    :param width_pix: pixels a line at bpp, 320 at 2 bpp or 640 at 1 bpp for a screen
+    """
+    indices = banks_indices(call, width_pix, bpp, 2 if interlaced else 1,
+                            hight=math.ceil(len(call) / math.ceil(width_pix * bpp / 8)) + 1)
+    pixels = composite_indices(indices, bpp, pallete)
+    instrument.count("pixels_drawn", pixels.shape[0] * pixels.shape[1])
+    return Image.fromarray(pixels)
+
+
+def stride_equality(a: np.ndarray, lags: range) -> np.ndarray:
+    """
+    :return: for each lag, the fraction of bytes equal to the byte lag after them
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(a, lags.stop)
+    return (windows[:, lags] == windows[:, :1]).mean(axis=0)
+
+
+def auto_geometry(scroll: bytes) -> tuple[int, bool, int]:
+    """
+    Guess how a dump is laid out: lines repeat their neighbours, so the line size stands out in the equality of
+    bytes one line apart over that of the sizes around it. An interlaced dump, split in two fields at the middle as
+    by draw_CG, has the same line of each field more alike than neighbouring lines of a field. A BSAVE header is
+    skipped.
+
+    :return: line width in pixels, interlaced, offset
+    """
+    offset = BSAVE_HEADER_SZ if len(scroll) > BSAVE_HEADER_SZ and scroll[0] == BSAVE_ID else 0
+    a = np.frombuffer(scroll, np.uint8, offset=offset)
+    half = len(a) // 2
+    lags = range(AUTO_LINE_SZ.start - 1, min(AUTO_LINE_SZ.stop + 1, half))
+    if len(lags) < 3:
+        return LINE_PIX, False, offset
+    alike = stride_equality(a, lags)
+    contrast = alike[1:-1] - (alike[:-2] + alike[2:]) / 2
+    line_i = 1 + int(np.argmax(contrast))
+    fields_alike = np.count_nonzero(a[:half] == a[half: 2 * half]) / half
+    return 4 * lags[line_i], bool(fields_alike > alike[line_i]), offset
+
+
+def bsave_split(call: bytes) -> tuple[Optional[tuple[int, int]], bytes]:
+    """
+    :return: the segment and offset of a BSAVE header, and the data after it; or None and the bytes as they were
+    """
+    if len(call) < BSAVE_HEADER_SZ or call[0] != BSAVE_ID:
+        return None, call
+    segment, offset, length = (int.from_bytes(call[i: i + 2], "little") for i in range(1, BSAVE_HEADER_SZ, 2))
+    if len(call) - BSAVE_HEADER_SZ - length not in {0, len(BSAVE_EOF)}:
+        return None, call
+    return (segment, offset), call[BSAVE_HEADER_SZ: BSAVE_HEADER_SZ + length]
+
+
+def disk_pictures(path: str | os.PathLike) -> Iterator[tuple[str, bytes]]:
+    """
+    :return: the name and data of each BSAVE file of the B800 segment on a FAT12 disk image
+    """
+    snapshot = pcarch.tool_load("disk").Disk(path).snapshot()
+    for entry in snapshot:
+        header, scroll = bsave_split(snapshot.file_get(entry.full_name))
+        if header is not None and header[0] == BSAVE_SEGMENT:
+            yield entry.full_name, scroll
+
+
+def disk_spec(scroll_nom: str) -> Optional[tuple[str, str]]:
+    """
+    :return: the disk image and file name of a disk.img:FILE.PIC, or None for any other path
+    """
+    image_nom, colon, nom = scroll_nom.rpartition(":")
+    if colon and os.path.isfile(image_nom) and not os.path.exists(scroll_nom):
+        return image_nom, nom
+    return None
+
+
+def scroll_read(scroll_nom: str, offset: int = 0, length: Optional[int] = None) -> bytes:
+    """
+    :param scroll_nom: a file, or disk.img:FILE.PIC for a file on a FAT12 disk image, less its BSAVE header
+    :param length: bytes to read from offset, by default to the end
+    """
+    spec = disk_spec(scroll_nom)
+    if spec is not None:
+        image_nom, nom = spec
+        scroll = pcarch.tool_load("disk").Disk(image_nom).snapshot().file_get(nom)
+        return bsave_split(scroll)[1][offset:][:length]
+    with open(scroll_nom, "rb") as file:
+        file.seek(offset)
+        return file.read(-1 if length is None else length)
+
+
+def render(scroll: bytes, action: str, line_length: int = LINE_PIX, pallete: pallete_t = (1, True, BG),
+           columns: int = TEXT_COLUMNS, font: Optional[font_t] = None, intense_bg: bool = False,
+           graphics: GraphicsMode = GRAPHICS_MODES["herc"], bpp: int = 2) -> Image.Image:
+    """
+    :param action: one of MODES; gm to draw banks in the graphics mode; cm, or progressive cm-p, to draw as a
+        composite monitor
+    :param bpp: of cm, 2 for 320 pixel screens or 1 for 640 pixel ones
+    """
+    if action == "cg":
+        return draw_CG(scroll, line_length, True, *pallete)
+    elif action == "cg-p":
+        return draw_CG(scroll, line_length, False, *pallete)
+    elif action == "lm":
+        return draw_CG(scroll, MESG_WIDTH, False, *pallete)
+    elif action == "ft":
+        return draw_1bit_font(scroll)
+    elif action == "tx":
+        return draw_text(scroll, columns, font, intense_bg)
+    elif action == "gm":
+        return draw_banks(scroll, graphics, pallete)
+    elif action in {"cm", "cm-p"}:
+        if bpp not in {1, 2}:
+            raise ValueError(f"no composite at {bpp} bpp")
+        return draw_composite(scroll, line_length * 2 // bpp, action == "cm", bpp, pallete)
+    raise ValueError(f"no such mode {action}")
+
+
+batch_result_t = tuple[pathlib.Path, str, str, Optional["Image.Image"]]
+
+
+def batch_output(out: pathlib.Path, mtime: float, scroll_get: Callable[[], bytes], mode: str, line_length: int,
+                 pallete: pallete_t, thumb: bool) -> tuple[str, Optional[Image.Image]]:
+    """
+    Render to out unless that is already newer than mtime
+
+    :return: "rendered", "up to date" or an error message, and the thumbnail if asked for
+    """
+    status = "rendered"
+    try:
+        if out.exists() and out.stat().st_mtime >= mtime:
+            status = "up to date"
+            image = Image.open(out) if thumb else None
+        else:
+            image = render(scroll_get(), mode, line_length, pallete)
+            image.save(out)
+        if thumb:
+            image = image.convert("RGB")
+            image.thumbnail(THUMB_SZ)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", None
+    return status, image if thumb else None
+
+
+def batch_render(path: pathlib.Path, mode: str, line_length: int, offset: int, pallete: pallete_t, thumb: bool
+                 ) -> batch_result_t:
+    """
+    Render path to <path>.<mode>.png unless that is already newer than path
+
+    :return: path, mode, "rendered", "up to date" or an error message, and the thumbnail if asked for
+    """
+    def scroll_get() -> bytes:
+        with open(path, "rb") as file:
+            file.seek(offset)
+            return file.read()
+
+    try:
+        mtime = path.stat().st_mtime
+    except OSError as e:
+        return path, mode, f"{type(e).__name__}: {e}", None
+    out = path.with_name(f"{path.name}.{mode}.png")
+    return (path, mode) + batch_output(out, mtime, scroll_get, mode, line_length, pallete, thumb)
+
+
+def batch_render_disk(path: pathlib.Path, modes: Iterable[str], line_length: int, offset: int, pallete: pallete_t,
+                      thumb: bool) -> list[batch_result_t]:
+    """
+    Render every BSAVE picture of the B800 segment on the disk image at path, to <path>.<file>.<mode>.png
+    """
+    try:
+        mtime = path.stat().st_mtime
+        pictures = list(disk_pictures(path))
+    except Exception as e:
+        return [(path, "", f"{type(e).__name__}: {e}", None)]
+    back = []
+    for nom, scroll in pictures:
+        for mode in modes:
+            out = path.with_name(f"{path.name}.{nom}.{mode}.png")
+            back.append((pathlib.Path(f"{path}:{nom}"), mode)
+                        + batch_output(out, mtime, lambda: scroll[offset:], mode, line_length, pallete, thumb))
+    return back
+
+
+def batch_files(root: pathlib.Path) -> Iterator[pathlib.Path]:
+    for folder, _, files in os.walk(root):
+        for nom in sorted(files):
+            if not nom.lower().endswith(".png"):
+                yield pathlib.Path(folder, nom)
+
+
+def batch_worker(task: Callable, stats: bool, *args) -> tuple[Any, dict[str, int], dict[str, float]]:
+    """
+    Run task in a pool worker on fresh counters, as the worker's own never reach the parent
+
+    :return: what task returns, and the counts and phase times it made
+    """
+    instrument.STATS.reset()
+    instrument.STATS.enabled, instrument.STATS.hooks = stats, []
+    return task(*args), dict(instrument.STATS.counts), dict(instrument.STATS.phases)
+
+
+def contact_sheets(root: pathlib.Path, mode: str, thumbs: list[tuple[pathlib.Path, Image.Image]], per_sheet: int):
+    cell_w, cell_h = THUMB_SZ[0], THUMB_SZ[1] + SHEET_LABEL
+    for sheet_i in range(0, len(thumbs), per_sheet):
+        cells = thumbs[sheet_i: sheet_i + per_sheet]
+        rows = math.ceil(len(cells) / SHEET_COLUMNS)
+        sheet = Image.new("RGB", (SHEET_COLUMNS * cell_w, rows * cell_h))
+        draw = ImageDraw.Draw(sheet)
+        for cell_i, (path, thumb) in enumerate(cells):
+            x, y = cell_i % SHEET_COLUMNS * cell_w, cell_i // SHEET_COLUMNS * cell_h
+            sheet.paste(thumb, (x, y))
+            draw.text((x, y + THUMB_SZ[1]), str(path.relative_to(root))[-cell_w // 6:], fill=(0xFF, 0xFF, 0xFF))
+        sheet.save(root / f"contact-{mode}-{sheet_i // per_sheet:03}.png")
+
+
+def batch(root: pathlib.Path, modes=MODES, line_length: int = LINE_PIX, offset: int = 0,
+          pallete: pallete_t = (1, True, BG), jobs: Optional[int] = None, per_sheet: int = 0, disks: bool = False):
+    """
+    Render every file under root in each mode, printing failures, and tile per_sheet thumbnails a contact sheet
+
+    :param disks: render instead the pictures on every disk image under root
+    """
+    thumbs = {mode: [] for mode in modes}
+    stats = instrument.STATS.enabled
+    with futures.ProcessPoolExecutor(jobs) as pool:
+        if disks:
+            tasks = [pool.submit(batch_worker, batch_render_disk, stats, path, modes, line_length, offset, pallete,
+                                 per_sheet > 0)
+                     for path in batch_files(root) if path.suffix.lower() in DISK_IMAGE_SUFFIXES]
+        else:
+            tasks = [pool.submit(batch_worker, batch_render, stats, path, mode, line_length, offset, pallete,
+                                 per_sheet > 0)
+                     for path in batch_files(root) for mode in modes]
+        for task in tasks:
+            result, counts, phases = task.result()
+            instrument.STATS.merge(counts, phases)
+            for path, mode, status, thumb in result if disks else [result]:
+                if status in {"rendered", "up to date"}:
+                    instrument.count(f"batch_{status.replace(' ', '_')}")
+                    if thumb is not None:
+                        thumbs[mode].append((path, thumb))
+                else:
+                    instrument.count("batch_failed")
+                    print(f"{path} {mode}: {status}")
+    if per_sheet:
+        for mode, mode_thumbs in thumbs.items():
+            contact_sheets(root, mode, mode_thumbs, per_sheet)
+
+
+def stream_strips(path: str, width_pix: int = LINE_PIX, strip_hight: int = STRIP_HIGHT, offset: int = 0
+                  ) -> Iterator[np.ndarray]:
+    """
+    Map a progressive dump of any size, and unpack it a strip of lines at a time
+
+    :return: the pixel indices of each strip, the last one short
+    """
+    line_sz = math.ceil(width_pix / 4)
+    strip_sz = line_sz * strip_hight
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size <= offset:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as scroll:
+            for start in range(offset, len(scroll), strip_sz):
+                yield lines_unpack(scroll[start: start + strip_sz], line_sz)[:, :width_pix]
+
+
+def stream_render(path: str, folder: pathlib.Path, width_pix: int = LINE_PIX, strip_hight: int = STRIP_HIGHT,
+                  offset: int = 0, pallete: pallete_t = (1, True, BG), levels: int = 1) -> list[int]:
+    """
+    Render a dump to folder/<level>/<strip>.png, saving each strip as it completes. Level 0 is full size; every
+    further level halves the one before, for zooming out, so memory stays a strip per level.
+
+    :return: strips saved per level
+    """
+    saved = [0] * levels
+    pending: list[Optional[np.ndarray]] = [None] * levels  # rows of each level waiting for a full strip
+
+    def save(level: int, image: Image.Image):
+        (folder / str(level)).mkdir(parents=True, exist_ok=True)
+        image.save(folder / str(level) / f"{saved[level]:05}.png")
+        saved[level] += 1
+        instrument.count(f"strips_level_{level}")
+        if level + 1 < levels and image.height > 1:
+            rows = np.asarray(image.convert("RGB").reduce(2))
+            pending[level + 1] = rows if pending[level + 1] is None else np.concatenate((pending[level + 1], rows))
+            while len(pending[level + 1]) >= strip_hight:
+                strip, pending[level + 1] = pending[level + 1][:strip_hight], pending[level + 1][strip_hight:]
+                save(level + 1, Image.fromarray(strip))
+
+    for indices in stream_strips(path, width_pix, strip_hight, offset):
+        instrument.count("pixels_drawn", indices.size)
+        image = Image.fromarray(indices)
+        image.putpalette(pallete_table(*pallete))
+        save(0, image)
+    for level in range(1, levels):
+        if pending[level] is not None and len(pending[level]):
+            save(level, Image.fromarray(pending[level]))
+    return saved
+
+
+def animate_frames(scrolls: Iterable[bytes], mode: str = "cg", line_length: int = LINE_PIX,
+                   pallete: pallete_t = (1, True, BG), columns: int = TEXT_COLUMNS, font: Optional[font_t] = None,
+                   intense_bg: bool = False) -> Iterator[Image.Image]:
+    """
+    Render a sequence of dumps, re-rendering of each only the lines whose bytes changed since the one before
+
+    :param mode: one of MODES but ft
+    """
+    if mode == "tx":
+        unit_sz, unit_rows = 2 * columns, LETTER_HIGHT
+        full = draw = lambda call: text_indices(call, columns, font, intense_bg)
+        colors = text_pallete()
+    elif mode in {"cg", "cg-p", "lm"}:
+        width = MESG_WIDTH if mode == "lm" else line_length
+        unit_sz, unit_rows = math.ceil(width / 4), 1
+        full = lambda call: CG_indices(call, width, mode == "cg")
+        draw = lambda call: lines_unpack(call, unit_sz)[:, :width]
+        colors = pallete_table(*pallete)
+    else:
+        raise ValueError(f"cannot animate {mode}")
+
+    last = indices = None
+    for scroll in scrolls:
+        instrument.count("frames")
+        if last is None or len(last) != len(scroll):
+            indices = full(scroll)
+            instrument.count("pixels_drawn", indices.size)
+        elif last != scroll:
+            # each field of an interlaced dump covers every other line
+            fields = (0, len(scroll) // 2, len(scroll)) if mode == "cg" else (0, len(scroll))
+            step = len(fields) - 1
+            changed = np.flatnonzero(np.frombuffer(last, np.uint8) != np.frombuffer(scroll, np.uint8))
+            for field_i, (start, end) in enumerate(zip(fields, fields[1:])):
+                in_field = changed[(changed >= start) & (changed < end)]
+                for line in np.unique((in_field - start) // unit_sz):
+                    row = (step * int(line) + field_i) * unit_rows
+                    if row >= len(indices):
+                        continue
+                    line_start = start + int(line) * unit_sz
+                    pixels = draw(scroll[line_start: min(line_start + unit_sz, end)])
+                    indices[row: row + unit_rows] = pixels[:len(indices) - row]
+                    instrument.count("lines_rerendered")
+                    instrument.count("pixels_drawn", pixels.size)
+        last = scroll
+        image = Image.fromarray(indices.copy())
+        image.putpalette(colors)
+        yield image
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("scroll")
-    parser.add_argument("action")
+    parser.add_argument("scroll", help="a file, or a folder for batch")
+    parser.add_argument("action", choices=("cg", "lm", "ft", "tx", "batch", "auto", "stream", "animate", "encode",
+                                           "tiles", "scan", "gm", "cm"))
     parser.add_argument("line_length", type=int, default=LINE_PIX, nargs="?")
     parser.add_argument("-p", "--progrssive", action="store_true")
     parser.add_argument("-o", "--offset", type=int, default=0, nargs="?")
+    parser.add_argument("-n", "--length", type=int, help="bytes to read from the offset, by default to the end")
+    parser.add_argument("--pallete", type=int, choices=PALLETES, default=1, help="mode 4 palette 0 or 1, or mode 5")
+    parser.add_argument("-l", "--low-intensity", action="store_true")
+    parser.add_argument("--bg", type=int, choices=range(0x10), default=BG, metavar="0-15", help="background color")
+    parser.add_argument("-a", "--all-palletes", action="store_true",
+                        help="save every palette, intensity and background variant of a cg or lm render")
+    parser.add_argument("-c", "--columns", type=int, choices=(80, 40), default=TEXT_COLUMNS, help="tx columns")
+    parser.add_argument("-f", "--font", help="tx 1-bit 8x8 font file, instead of the built-in ASCII and box drawing")
+    parser.add_argument("-i", "--intense-bg", action="store_true",
+                        help="tx attribute bit 7 is background intensity rather than blink")
+    parser.add_argument("--strip", type=int, default=STRIP_HIGHT, help="stream lines per strip")
+    parser.add_argument("--levels", type=int, default=1, help="stream zoom levels, each half the size of the last")
+    parser.add_argument("--frames", choices=[m for m in MODES if m != "ft"], default="cg", help="animate mode")
+    parser.add_argument("--duration", type=int, default=100, help="animate milliseconds per frame")
+    parser.add_argument("--gif", action="store_true", help="animate to GIF rather than APNG")
+    parser.add_argument("-d", "--dither", choices=DITHERS, default="none", help="encode dithering")
+    parser.add_argument("-r", "--raw", action="store_true", help="encode without the BSAVE header")
+    parser.add_argument("-t", "--tile", type=lambda v: tuple(map(int, v.split("x"))), default=(8, 8),
+                        metavar="WxH", help="tiles size in pixels")
+    parser.add_argument("--bpp", type=int, choices=(1, 2, 4), help="tiles (by default 2), gm and cm bits per pixel")
+    parser.add_argument("-g", "--graphics", choices=GRAPHICS_MODES, default="herc", help="gm graphics mode")
+    parser.add_argument("--banks", type=int, help="gm banks, interleaved line by line")
+    parser.add_argument("--bank-sz", type=lambda v: int(v, 16), help="gm bytes a bank, hex")
+    parser.add_argument("--layout", choices=TILE_LAYOUTS, default="linear",
+                        help="tiles one after the other, or cut from a line_length screen")
+    parser.add_argument("--top", type=int, default=20, help="scan regions to list")
+    parser.add_argument("-m", "--modes", choices=MODES, nargs="+", default=MODES, help="batch render modes")
+    parser.add_argument("-j", "--jobs", type=int, help="batch worker processes, by default one per CPU")
+    parser.add_argument("--disks", action="store_true", help="batch the BSAVE pictures on the disk images instead")
+    parser.add_argument("-s", "--sheet", type=int, default=0, metavar="N",
+                        help="batch also tiles N thumbnails per contact-<mode>-<n>.png sheet")
+    parser.add_argument("--stats", "--profile", action="store_true",
+                        help="print pixel counts and phase times as JSON to stderr")
     args = parser.parse_args()
+    if args.stats:
+        instrument.report_at_exit()
 
     def main():
         scroll_nom = args.scroll
-        with open(scroll_nom, "rb") as file:
-            file.seek(args.offset)
-            scroll = file.read()
-
-        if args.action == "cg":
-            image = draw_CG(scroll, args.line_length, not args.progrssive)
-        elif args.action == "lm":
-            image = draw_CG(scroll, MESG_WIDTH, False)
-        elif sys.argv[2] == "ft":
-            image = draw_1bit_font(scroll)
-        else:
-            raise ValueError
+        spec = disk_spec(scroll_nom)
+        out_nom = scroll_nom if spec is None else ".".join(spec)  # the output of disk.img:FILE goes to disk.img.FILE
+        pallete = args.pallete, not args.low_intensity, args.bg
+        if args.action == "batch":
+            with instrument.phase("batch"):
+                batch(pathlib.Path(scroll_nom), args.modes, args.line_length, args.offset, pallete, args.jobs,
+                      args.sheet, args.disks)
+            return
+        if args.action == "animate":
+            font = None
+            if args.font:
+                with open(args.font, "rb") as file:
+                    font = get_1bit_font(file.read())
+            paths = [path for path in sorted(pathlib.Path(scroll_nom).iterdir())
+                     if path.is_file() and path.suffix.lower() not in {".png", ".gif"}]
+            frames = animate_frames((path.read_bytes()[args.offset:] for path in paths), args.frames,
+                                    args.line_length, pallete, args.columns, font, args.intense_bg)
+            with instrument.phase("animate"):
+                out = f"{pathlib.Path(scroll_nom)}.{'gif' if args.gif else 'png'}"
+                frames = list(frames)  # the APNG writer goes over them twice
+                frames[0].save(out, save_all=True, append_images=frames[1:], duration=args.duration, loop=0)
+            print(f"{out}: {len(paths)} frames")
+            return
+        if args.action == "encode":
+            with instrument.phase("encode"):
+                scroll = encode_CG(Image.open(scroll_nom), not args.progrssive, pallete, args.dither, not args.raw)
+            with open(f"{scroll_nom}.{'bin' if args.raw else 'pic'}", "wb") as file:
+                file.write(scroll)
+            return
+        if args.action == "tiles":
+            with instrument.phase("read"):
+                scroll = scroll_read(scroll_nom, args.offset, args.length)
+            with instrument.phase("tiles"):
+                (width, hight), interlaced = args.tile, not args.progrssive
+                bpp = args.bpp or 2
+                tiles, columns = tile_bytes(scroll, width, hight, bpp, args.layout, args.line_length, interlaced)
+                unique, index = tiles_dedupe(tiles)
+                instrument.count("tiles", len(tiles))
+                instrument.count("tiles_unique", len(unique))
+            with instrument.phase("save"):
+                draw_tiles(unique, width, hight, bpp, pallete).save(f"{out_nom}.tiles.png")
+                with open(f"{out_nom}.tiles.json", "w") as file:
+                    json.dump({"tile": args.tile, "bpp": bpp, "layout": args.layout, "unique": len(unique),
+                               "sheet_columns": SHEET_TILES,
+                               "map": index.reshape(-1, columns).tolist()}, file)
+            print(f"{scroll_nom}: {len(tiles)} tiles, {len(unique)} unique")
+            return
+        if args.action == "scan":
+            with instrument.phase("scan"):
+                regions = scan(scroll_nom)
+            for offset, size, action, score in regions[:args.top]:
+                print(f"{offset:#010x} {size:#08x} {score:6.2f}  {scroll_nom} {action} -o {offset} -n {size}")
+            return
+        if args.action == "stream":
+            with instrument.phase("stream"):
+                saved = stream_render(scroll_nom, pathlib.Path(f"{scroll_nom}.strips"), args.line_length,
+                                      args.strip, args.offset, pallete, args.levels)
+            print(f"{scroll_nom}.strips: " + ", ".join(f"level {level} {n} strips" for level, n in enumerate(saved)))
+            return
+        with instrument.phase("read"):
+            scroll = scroll_read(scroll_nom, args.offset, args.length)
+
+        if args.action == "auto":
+            with instrument.phase("auto"):
+                args.line_length, interlaced, offset = auto_geometry(scroll)
+            args.action, args.progrssive, args.offset = "cg", not interlaced, args.offset + offset
+            scroll = scroll[offset:]
+            print(f"{scroll_nom} cg {args.line_length}{'' if interlaced else ' -p'} -o {args.offset}")
+
+        with instrument.phase("render"):
+            mode = f"{args.action}-p" if args.action in {"cg", "cm"} and args.progrssive else args.action
+            font = None
+            if args.font:
+                with open(args.font, "rb") as file:
+                    font = get_1bit_font(file.read())
+            overrides = {"bpp": args.bpp, "banks": args.banks, "bank_sz": args.bank_sz}
+            graphics = dataclasses.replace(GRAPHICS_MODES[args.graphics],
+                                           **{key: value for key, value in overrides.items() if value is not None})
+            image = render(scroll, mode, args.line_length, pallete, args.columns, font, args.intense_bg, graphics,
+                           1 if args.bpp == 1 else 2)
 
-        image.save(f"{scroll_nom}.png")
+        with instrument.phase("save"):
+            if args.all_palletes and args.action in {"cg", "lm"}:
+                for pallete, intense, bg in pallete_variants():
+                    image.putpalette(pallete_table(pallete, intense, bg))
+                    image.save(f"{out_nom}.{pallete}{'h' if intense else 'l'}{bg:X}.png")
+            else:
+                image.save(f"{out_nom}.png")
     main()
@@ -0,0 +1,187 @@
+"""Benchmarks of the 5¼'-disk hot paths, over synthetic images of every FAT ID"""
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Optional
+
+import pcarch
+
+disk = pcarch.tool_load("disk")
+
+Fat_IDs = (0xFF, 0xFE, 0xFD, 0xFC)
+Layouts = ("empty", "fragmented", "full", "small")
+Stamp = datetime.datetime(1983, 3, 8, 12, 0, 0)
+Baseline_Path = pathlib.Path(__file__).parent.parent / "bench" / "baseline.json"
+
+
+def prototype(folder: pathlib.Path, fat_id: int):
+    """A formatted image with a dummy boot sector, to serve as host for the synthetic ones"""
+    struct = disk.DiskStruct(fat_id)
+    boot = b'\xEB\x20\x90' + b'\xF6' * (disk.Sector_sz - 3)
+    fat = disk.fat12_to_buffer([fat_id | 0xF00, 0xFFF] + [0] * struct.fat_entrys)
+    root_dir = (b'\xE5' + b'\xF6' * 0x1F) * struct.root_dir_entries
+    path = folder / f"proto{fat_id:X}.img"
+    with open(path, "wb") as codex:
+        codex.write(boot + b''.join(fat) * disk.Fat_Numb + root_dir + b'\xF6' * struct.files_sz)
+    return disk.Disk(path)
+
+
+def synthetic_entry(index: int, size: int):
+    return disk.FileEntry(f"FILE{index:04}", "BIN", Stamp, Stamp.date(), Stamp, 0, size, 0)
+
+
+def synthetic_add(codex, rng: random.Random, index: int, size: int) -> bool:
+    byti = rng.randbytes(size)
+    sectors = (byti[i: i + disk.Sector_sz] for i in range(0, size, disk.Sector_sz))
+    try:
+        codex.entry_add(synthetic_entry(index, size), sectors)
+    except disk.Disk.OutOfSpace:
+        return False
+    return True
+
+
+def synthetic(host, path: pathlib.Path, layout: str, seed: int = 0):
+    """
+    :param layout: empty; fragmented, with files scattered in the gaps of deleted ones;
+        full, of large files; small, a directory full of files smaller than a sector
+    """
+    rng = random.Random(seed)
+    codex = disk.empty_disk(host, path)
+    struct = codex.struct
+    entries = struct.root_dir_entries
+    if layout == "fragmented":
+        for i in range(entries // 2):
+            if not synthetic_add(codex, rng, i, rng.randrange(1, 4) * struct.cluster_sz):
+                break
+        for i in range(0, entries // 2, 2):
+            codex.file_del(f"FILE{i:04}.BIN")
+        for i in range(entries // 2, entries - 1):
+            if not synthetic_add(codex, rng, i, rng.randrange(3, 12) * struct.cluster_sz - rng.randrange(0x200)):
+                break
+    elif layout == "full":
+        size = struct.files_sz // (entries // 4)
+        for i in range(entries):
+            if not synthetic_add(codex, rng, i, size):
+                break
+        free = len(codex.fat.fili_locate()[1]) * struct.cluster_sz
+        if free:
+            synthetic_add(codex, rng, entries, free)
+    elif layout == "small":
+        for i in range(entries - 1):
+            synthetic_add(codex, rng, i, rng.randrange(1, disk.Sector_sz))
+    elif layout != "empty":
+        raise ValueError(f"no such layout {layout}")
+    codex.img.flush()
+    return codex
+
+
+def best_time(task: Callable, repeat: int, setup: Optional[Callable] = None) -> float:
+    back = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        task()
+        back = min(back, time.perf_counter() - start)
+    return back
+
+
+def bench_image(host, folder: pathlib.Path, layout: str, repeat: int) -> dict[str, dict[str, float]]:
+    fat_id = host.struct.fat_id
+    path = folder / f"{fat_id:X}-{layout}.img"
+    synthetic(host, path, layout)
+    scroll = disk.Disk(path)
+    size = sum(e.size for e in scroll.root_dir())
+    extracted = folder / path.stem
+    moved = folder / f"{path.stem}-folder"
+
+    def clean():
+        for p in folder.iterdir():
+            if p.name.startswith(moved.name) and p.is_file():
+                p.unlink()
+        shutil.rmtree(extracted, ignore_errors=True)
+
+    def files_add():
+        codex = disk.empty_disk(host, folder / f"{moved.name}.img")
+        for nom in sorted(os.listdir(moved)):
+            codex.file_add(str(moved / nom))
+
+    back = {"open": best_time(lambda: disk.Disk(path), repeat),
+            "fili_locate": best_time(scroll.fat.fili_locate, repeat),
+            "fili_extract": best_time(scroll.fili_extract, repeat, clean)}
+    shutil.rmtree(moved, ignore_errors=True)
+    extracted.rename(moved)
+    back |= {"file_add": best_time(files_add, repeat, clean),
+             "folder_to_disk": best_time(lambda: disk.folder_to_disk(host, str(moved), fat_id), repeat, clean)}
+    rates = {}
+    for stage, seconds in back.items():
+        if stage in {"open", "fili_locate"}:
+            rates[stage] = {"seconds": seconds, "images/s": 1 / seconds}
+        else:
+            rates[stage] = {"seconds": seconds, "MB/s": size / seconds / 1e6 if size else None}
+    return rates
+
+
+def bench(repeat: int = 3, fat_ids=Fat_IDs, layouts=Layouts) -> dict[str, dict[str, float]]:
+    back = {}
+    with tempfile.TemporaryDirectory() as folder:
+        folder = pathlib.Path(folder)
+        for fat_id in fat_ids:
+            host = prototype(folder, fat_id)
+            for layout in layouts:
+                for stage, rate in bench_image(host, folder, layout, repeat).items():
+                    back[f"{fat_id:X}/{layout}/{stage}"] = rate
+    return back
+
+
+def report(results: dict, baseline: dict, tolerance: float) -> bool:
+    """
+    :return: whether any result regressed beyond tolerance from the baseline
+    """
+    regressed = False
+    for key, rate in results.items():
+        unit = "images/s" if "images/s" in rate else "MB/s"
+        line = f"{key:<32}{rate['seconds'] * 1000:>10.2f} ms"
+        if rate[unit] is not None:
+            line += f"{rate[unit]:>12.2f} {unit}"
+        old = baseline.get(key)
+        if old is not None:
+            ratio = old["seconds"] / rate["seconds"]
+            line += f"\t{ratio:.2f}x baseline"
+            if ratio < 1 - tolerance:
+                line += "\tREGRESSION"
+                regressed = True
+        print(line)
+    return regressed
+
+
+if __name__ == "__main__":
+    def main():
+        parser = argparse.ArgumentParser()
+        parser.add_argument("-r", "--repeat", type=int, default=3)
+        parser.add_argument("-b", "--baseline", type=pathlib.Path, default=Baseline_Path)
+        parser.add_argument("-s", "--save", action="store_true", help="store the results as the new baseline")
+        parser.add_argument("-t", "--tolerance", type=float, default=0.1)
+        parser.add_argument("--fat-id", type=lambda v: int(v, 16), nargs="*", default=Fat_IDs)
+        parser.add_argument("--layout", choices=Layouts, nargs="*", default=Layouts)
+        args = parser.parse_args()
+
+        results = bench(args.repeat, args.fat_id, args.layout)
+        baseline = {}
+        if args.baseline.exists():
+            with open(args.baseline) as file:
+                baseline = json.load(file)
+        regressed = report(results, baseline, args.tolerance)
+        if args.save:
+            args.baseline.parent.mkdir(parents=True, exist_ok=True)
+            with open(args.baseline, "w") as file:
+                json.dump(baseline | results, file, indent=1)
+        sys.exit(regressed)
+    main()
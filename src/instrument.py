@@ -0,0 +1,73 @@
+"""Opt-in counters, phase timers and hooks, shared by the tools"""
+import atexit
+import collections
+import contextlib
+import json
+import sys
+import time
+from typing import Callable, Iterator
+
+hook_t = Callable[[str, str, float], None]  # kind ("count" or "phase"), name, value (occurrences or seconds)
+
+
+class Stats:
+    def __init__(self):
+        self.enabled = False
+        self.counts: collections.Counter[str] = collections.Counter()
+        self.phases: collections.defaultdict[str, float] = collections.defaultdict(float)
+        self.hooks: list[hook_t] = []
+
+    def count(self, name: str, value: int = 1):
+        if not self.enabled:
+            return
+        self.counts[name] += value
+        for hook in self.hooks:
+            hook("count", name, value)
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_add(name, time.perf_counter() - start)
+
+    def phase_add(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        self.phases[name] += seconds
+        for hook in self.hooks:
+            hook("phase", name, seconds)
+
+    def merge(self, counts: dict[str, int], phases: dict[str, float]):
+        """Add the counts and phase times collected elsewhere, as in a worker process"""
+        for name, value in counts.items():
+            self.count(name, value)
+        for name, seconds in phases.items():
+            self.phase_add(name, seconds)
+
+    def subscribe(self, hook: hook_t):
+        self.enabled = True
+        self.hooks.append(hook)
+
+    def reset(self):
+        self.counts.clear()
+        self.phases.clear()
+
+    def to_json(self) -> str:
+        return json.dumps({"counts": self.counts, "seconds": self.phases}, indent=1)
+
+
+STATS = Stats()
+count = STATS.count
+phase = STATS.phase
+subscribe = STATS.subscribe
+
+
+def report_at_exit():
+    """Collect from now on, and print the results as JSON to stderr when the program ends"""
+    STATS.enabled = True
+    atexit.register(lambda: print(STATS.to_json(), file=sys.stderr))
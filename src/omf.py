@@ -1,3 +1,4 @@
+import argparse
 import itertools
 import sys
 from copy import copy
@@ -7,6 +8,8 @@ from types import NoneType
 from typing import Self, Optional
 from pathlib import Path
 
+import instrument
+
 BIG_SEGMENT = 0x1000
 
 
@@ -713,6 +716,7 @@ class Record:
         except ValueError as err:
             print(err)
             rectype = val[0]
+        instrument.count(f"records_{getattr(rectype, 'name', 'unknown')}")
         length = val[2] << 8 | val[1]
         val, rest = val[:length+3], val[length+3:]
         body = val[3:-1]
@@ -902,15 +906,31 @@ class DeserializedModule:
         self.threads[block.thread_type][block.thred] = back
 
 
-scroll_path = Path(sys.argv[1])
-for scroll in scroll_path.iterdir():
-    if scroll.suffix.lower() != ".obj":
-        continue
-    codex_path = Path(scroll.with_suffix('.record'))
-    with open(scroll, "rb") as f:
+def parse(path: Path) -> Module:
+    with instrument.phase("read"), open(path, "rb") as f:
         content = f.read()
-    module = Module(content)
-    with open(codex_path, "w") as f:
-        f.writelines(f"{key}={val}\n".replace(', ', ',\t') for key, val in vars(DeserializedModule(module())).items())
-        # f.writelines((str(m).replace(', ', ',\t') + '\n' for m in module()))
-    # print(f"{scroll.name}:", *(r.rectype.name for r in module()), sep=",\t")
+    with instrument.phase("parse"):
+        return Module(content)
+
+
+if __name__ == "__main__":
+    def main():
+        parser = argparse.ArgumentParser()
+        parser.add_argument("scroll_path", type=Path)
+        parser.add_argument("--stats", "--profile", action="store_true",
+                            help="print record counts and phase times as JSON to stderr")
+        args = parser.parse_args()
+        if args.stats:
+            instrument.report_at_exit()
+        for scroll in args.scroll_path.iterdir():
+            if scroll.suffix.lower() != ".obj":
+                continue
+            codex_path = Path(scroll.with_suffix('.record'))
+            module = parse(scroll)
+            with instrument.phase("deserialize"):
+                deserialized = DeserializedModule(module())
+            with instrument.phase("write"), open(codex_path, "w") as f:
+                f.writelines(f"{key}={val}\n".replace(', ', ',\t') for key, val in vars(deserialized).items())
+                # f.writelines((str(m).replace(', ', ',\t') + '\n' for m in module()))
+            # print(f"{scroll.name}:", *(r.rectype.name for r in module()), sep=",\t")
+    main()
@@ -0,0 +1,52 @@
+"""One entry point for the tools, importing only the one asked for"""
+import importlib.machinery
+import os
+import sys
+import types
+
+TOOLS = {"disk": "5¼'-disk.py", "cga": "CGA.py", "omf": "omf.py", "bench": "bench.py"}
+
+
+def tool_load(tool: str, name: str | None = None) -> types.ModuleType:
+    """
+    :param name: of the module, by default the tool's; __main__ runs the tool's CLI
+    :return: the tool, loaded as a module rather than run as a script, so its compiled bytecode is cached between runs
+    """
+    name = name or tool
+    if name != "__main__" and name in sys.modules:
+        return sys.modules[name]
+    path = os.path.join(os.path.dirname(__file__), TOOLS[tool])
+    loader = importlib.machinery.SourceFileLoader(name, path)
+    module = types.ModuleType(name)
+    module.__file__, module.__loader__ = path, loader
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    :return: the module, loaded on its first attribute access, so a tool starts without what its action never uses
+    """
+    import importlib.util
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def main(argv: list[str]):
+    if not argv or argv[0] not in TOOLS:
+        print(f"usage: pcarch {{{','.join(TOOLS)}}} ...", file=sys.stderr)
+        return 2
+    sys.argv = [f"pcarch {argv[0]}", *argv[1:]]
+    tool_load(argv[0], "__main__")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
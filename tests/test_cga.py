@@ -0,0 +1,181 @@
+import pathlib
+import random
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent / "src"))
+
+import pcarch
+
+cga = pcarch.tool_load("cga", "CGA")
+
+
+def scroll(length: int, seed: int = 0) -> bytes:
+    return random.Random(seed).randbytes(length)
+
+
+def test_composite_defaults_to_2bpp():
+    call = scroll(0x1000)
+    image = np.asarray(cga.render(call, "cm"))
+    assert (image == np.asarray(cga.draw_composite(call, cga.LINE_PIX, True, 2))).all()
+    assert (image != np.asarray(cga.render(call, "cm", bpp=1))).any()
+    with pytest.raises(ValueError):
+        cga.render(call, "cm", bpp=4)
+
+
+def test_scan_refines_edges(tmp_path):
+    rng = np.random.default_rng(0)
+    code = rng.choice(0x100, 0x3000, p=np.r_[np.full(0x10, .02), np.full(0xF0, .68 / 0xF0)]).astype(np.uint8)
+    bands = rng.choice(np.array([0, 0, 0, 0, 0x55, 0xAA, 0xFF, 0x05, 0x50], np.uint8), (25, cga.LINE_SZ))
+    picture = np.repeat(bands, 8, axis=0).tobytes()  # 200 lines, each band 8 alike
+    start = 0x1234
+    path = tmp_path / "blob.bin"
+    path.write_bytes(code[:start].tobytes() + picture + code[start:].tobytes())
+    offset, size, action, _ = cga.scan(str(path))[0]
+    assert (offset, size, action) == (start, len(picture), "cg")
+    assert cga.scroll_read(str(path), offset, size) == picture
+
+
+def CG_reference(call: bytes, width_pix: int, interlaced: bool, pallete: cga.pallete_t) -> np.ndarray:
+    """
+    :return: the RGB pixels of call, drawn a pixel at a time as draw_CG once did
+    """
+    line_sz = -(-width_pix // 4)
+    hight = -(-len(call) // line_sz) + 1
+    pixels = np.zeros((hight, width_pix, 3), np.uint8)
+    fields = (call[:len(call) // 2], call[len(call) // 2:]) if interlaced else (call,)
+    for field_i, field in enumerate(fields):
+        for byte_i, byte in enumerate(field):
+            y = byte_i // line_sz * (2 if interlaced else 1) + field_i
+            for pixel_i in range(4):
+                x = byte_i % line_sz * 4 + pixel_i
+                if x < width_pix and y < hight:
+                    pixels[y, x] = cga.CGA_mode4_pallete(byte >> 6 - 2 * pixel_i, *pallete)
+    return pixels
+
+
+@pytest.mark.parametrize("length, width_pix", [(0x4000, cga.LINE_PIX), (0x1001, 13), (999, 130), (7, 6), (1, 4)])
+@pytest.mark.parametrize("interlaced", [True, False])
+def test_draw_CG(length, width_pix, interlaced):
+    call = scroll(length, length)
+    for pallete in ((1, True, cga.BG), (0, False, 0xE)):
+        image = cga.draw_CG(call, width_pix, interlaced, *pallete).convert("RGB")
+        assert (np.asarray(image) == CG_reference(call, width_pix, interlaced, pallete)).all()
+
+
+@pytest.mark.parametrize("length", [0x100, 0x101, 1])
+def test_draw_2bit_font(length):
+    call = scroll(length, length)
+    reference = np.zeros((-(-length // 2), 8), np.uint8)
+    for byte_i, byte in enumerate(call):
+        y = 2 * (byte_i // 2)
+        for pixel_i in range(4):
+            if y < len(reference):
+                reference[y, 4 * (byte_i % 2) + pixel_i] = cga.MDA_pallete(byte >> 2 * pixel_i)
+    assert (np.asarray(cga.draw_2bit_font(call)) == reference).all()
+
+
+def font_reference(call: bytes) -> list[np.ndarray]:
+    """
+    :return: the glyphs of a 1-bit font, decoded a pixel at a time as get_1bit_font once did
+    """
+    font = []
+    for letter_i in range(-(-len(call) // cga.LETTER_HIGHT)):
+        glyph = np.zeros((cga.LETTER_HIGHT, cga.LETTER_WIDTH), bool)
+        for y, byte in enumerate(call[letter_i * cga.LETTER_HIGHT: (letter_i + 1) * cga.LETTER_HIGHT]):
+            for x in range(cga.LETTER_WIDTH):
+                glyph[y, x] = byte >> (7 - x) & 1
+        font.append(glyph)
+    return font
+
+
+def text_reference(call: bytes, font: list[np.ndarray]) -> np.ndarray:
+    """
+    :return: the pixels of call, copied a pixel at a time as draw_w_costume_font once did
+    """
+    pixels = np.zeros(((call.count(b'\r') + 1) * cga.LETTER_HIGHT, cga.LINE_PIX), bool)
+    for row, line in enumerate(call.split(b'\r')):
+        for col, byte in enumerate(line):
+            for letter_y in range(cga.LETTER_HIGHT):
+                for letter_x in range(cga.LETTER_WIDTH):
+                    x = col * cga.LETTER_WIDTH + letter_x
+                    if x < cga.LINE_PIX and byte - 0x80 < len(font):
+                        pixels[row * cga.LETTER_HIGHT + letter_y, x] = font[byte - 0x80][letter_y, letter_x]
+    return pixels
+
+
+@pytest.mark.parametrize("length", [0x400, 0x3F3, 5])
+def test_draw_w_costume_font(length):
+    call = scroll(length, length)
+    font = cga.get_1bit_font(call)
+    assert (font == np.array(font_reference(call))).all()
+    rng = random.Random(length)
+    text = b'\r'.join(bytes(rng.randrange(0x80, 0x100) for _ in range(rng.randrange(60))) for _ in range(7))
+    assert (np.asarray(cga.draw_w_costume_font(text, font)) == text_reference(text, font_reference(call))).all()
+    with pytest.raises(ValueError):
+        cga.draw_w_costume_font(b'\x80\x7F', font)
+
+
+def test_draw_1bit_font():
+    call = scroll(0x400)  # 128 glyphs, as many as the old path could draw
+    letters = b'\r'.join(bytes(range(0x80 + row, 0x80 + row + cga.ROW_LETTERS))
+                         for row in range(0, 0x80, cga.ROW_LETTERS))
+    assert (np.asarray(cga.draw_1bit_font(call)) == text_reference(letters, font_reference(call))).all()
+
+
+@pytest.mark.parametrize("width, hight", [(cga.LINE_PIX, 200), (77, 51)])
+@pytest.mark.parametrize("interlaced", [True, False])
+def test_encode_CG_round_trip(width, hight, interlaced):
+    indices = np.random.default_rng(width).integers(0, 4, (hight, width), np.uint8)
+    for pallete in cga.pallete_variants():
+        colors = np.array(cga.pallete_table(*pallete), np.uint8).reshape(-1, 3)
+        image = Image.fromarray(colors[indices])
+        call = cga.encode_CG(image, interlaced, pallete, bsave=False)
+        drawn = np.asarray(cga.draw_CG(call, width, interlaced, *pallete).convert("RGB"))
+        assert (drawn[:hight] == colors[indices]).all()
+    call = cga.encode_CG(image, interlaced, pallete)
+    assert call[:cga.BSAVE_HEADER_SZ] == cga.bsave_header(len(call) - cga.BSAVE_HEADER_SZ - 1)
+    assert call.endswith(cga.BSAVE_EOF)
+
+
+def banks_reference(call: bytes, width_pix: int, bpp: int, banks: int, bank_sz, hight: int) -> np.ndarray:
+    """
+    :return: the pixel indices of call, decoded a pixel at a time, line i from bank i % banks
+    """
+    per_byte, line_sz = 8 // bpp, -(-width_pix * bpp // 8)
+    split = bank_sz or len(call) // banks
+    pixels = np.full((hight, width_pix), 1 << bpp, np.uint8)
+    for byte_i, byte in enumerate(call):
+        if bank_sz is None:  # split evenly, the last bank taking the rest
+            bank_i = min(byte_i // split, banks - 1) if split else banks - 1
+        else:
+            bank_i = byte_i // split
+        y = (byte_i - bank_i * split) // line_sz * banks + bank_i
+        for pixel_i in range(per_byte):
+            x = (byte_i - bank_i * split) % line_sz * per_byte + pixel_i
+            if bank_i < banks and x < width_pix and y < hight:
+                pixels[y, x] = byte >> (8 - bpp * (pixel_i + 1)) & ((1 << bpp) - 1)
+    return pixels
+
+
+@pytest.mark.parametrize("mode", [*cga.GRAPHICS_MODES.values(), cga.GraphicsMode(21, 13, 4, 3, 0x1F),
+                                  cga.GraphicsMode(13, 11, 1, 4), cga.GraphicsMode(9, 40, 2, 3)])
+@pytest.mark.parametrize("length", [0x8000, 0x1001, 3])
+def test_banks_indices(mode, length):
+    call = scroll(length, length)
+    indices = cga.banks_indices(call, mode.width, mode.bpp, mode.banks, mode.bank_sz, mode.hight)
+    reference = banks_reference(call, mode.width, mode.bpp, mode.banks, mode.bank_sz, mode.hight)
+    assert (indices == reference).all()
+    image = cga.draw_banks(call, mode)
+    assert image.size == (mode.width, mode.hight)
+    assert (np.asarray(image) == reference).all()
+
+
+def test_builtin_font_before_pillow_10_1(monkeypatch):
+    font, load_default_imagefont = cga.builtin_font(), cga.ImageFont.load_default_imagefont
+    monkeypatch.delattr(cga.ImageFont, "load_default_imagefont")
+    monkeypatch.setattr(cga.ImageFont, "load_default", load_default_imagefont)  # which was the bitmap font then
+    assert (cga.builtin_font.__wrapped__() == font).all()
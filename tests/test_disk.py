@@ -0,0 +1,124 @@
+import dataclasses
+import io
+import pathlib
+import sys
+import tarfile
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent / "src"))
+
+import bench
+import pcarch
+
+disk = pcarch.tool_load("disk")
+
+
+def tar_stream(fili: dict[str, bytes]) -> io.BytesIO:
+    stream = io.BytesIO()
+    with tarfile.open(fileobj=stream, mode="w") as tar:
+        for nom, content in fili.items():
+            info = tarfile.TarInfo(nom)
+            info.size, info.mtime = len(content), bench.Stamp.timestamp()
+            tar.addfile(info, io.BytesIO(content))
+    stream.seek(0)
+    return stream
+
+
+def test_tar_long_names_sharing_prefix(tmp_path):
+    host = bench.prototype(tmp_path, 0xFD)
+    disk.tar_to_disk(host, str(tmp_path / "new"), None,
+                     tar_stream({"longfilename1.text": b"first", "longfilename2.text": b"second"}))
+    snapshot = disk.Disk(tmp_path / "new.img").snapshot()
+    assert {e.full_name: snapshot.file_get(e.full_name) for e in snapshot} == {"LONGFILE.TEX": b"first",
+                                                                                "LONGFI~1.TEX": b"second"}
+
+
+def test_convert_keeps_hidden(tmp_path):
+    host = bench.prototype(tmp_path, 0xFD)
+    scroll = disk.empty_disk(host, str(tmp_path / "old.img"))
+    scroll.entry_add(dataclasses.replace(bench.synthetic_entry(0, 10), hidden=True), [b"hidden".ljust(10)])
+    scroll.entry_add(bench.synthetic_entry(1, 10), [b"shown".ljust(10)])
+    codexi = disk.disk_convert([disk.Disk(tmp_path / "old.img")], str(tmp_path / "new"), 0xFF)
+    assert {e.full_name: e.hidden for e in codexi[0].root_dir()} == {"FILE0000.BIN": True, "FILE0001.BIN": False}
+
+
+def empty_add(codex, *noms: str):
+    """Directory entries of empty files, with no cluster as DOS writes them"""
+    for nom in noms:
+        name, _, ext = nom.partition(".")
+        codex.root_dir.file_add(dataclasses.replace(bench.synthetic_entry(0, 0), name=name, ext=ext), 0)
+    codex.img.flush()
+
+
+def test_check_empty_files(tmp_path):
+    host = bench.prototype(tmp_path, 0xFD)
+    empty_add(disk.empty_disk(host, str(tmp_path / "old.img")), "EMPTY1.TXT", "EMPTY2.TXT")
+    assert disk.Disk(tmp_path / "old.img").check() == []
+
+
+def test_convert_keeps_empty_files(tmp_path):
+    host = bench.prototype(tmp_path, 0xFD)
+    scroll = disk.empty_disk(host, str(tmp_path / "old.img"))
+    scroll.entry_add(bench.synthetic_entry(0, 10), [b"full".ljust(10)])
+    empty_add(scroll, "EMPTY1.TXT", "EMPTY2.TXT")
+    codexi = disk.disk_convert([disk.Disk(tmp_path / "old.img")], str(tmp_path / "new"), 0xFF)
+    assert {e.full_name: e.first_cluster > 0 for e in codexi[0].root_dir()} == {
+        "FILE0000.BIN": True, "EMPTY1.TXT": False, "EMPTY2.TXT": False}
+    assert disk.Disk(tmp_path / "new.img").check() == []
+
+
+def test_tar_export_keeps_empty_files(tmp_path):
+    host = bench.prototype(tmp_path, 0xFD)
+    scroll = disk.empty_disk(host, str(tmp_path / "old.img"))
+    scroll.entry_add(bench.synthetic_entry(0, 10), [b"full".ljust(10)])
+    empty_add(scroll, "EMPTY.TXT")
+    stream = io.BytesIO()
+    disk.Disk(tmp_path / "old.img").tar_export(stream)
+    stream.seek(0)
+    with tarfile.open(fileobj=stream) as tar:
+        assert {info.name: info.size for info in tar} == {"FILE0000.BIN": 10, "EMPTY.TXT": 0}
+
+
+def test_optimize_keeps_empty_files(tmp_path):
+    host = bench.prototype(tmp_path, 0xFD)
+    scroll = disk.empty_disk(host, str(tmp_path / "old.img"))
+    scroll.entry_add(bench.synthetic_entry(0, 10), [b"full".ljust(10)])
+    empty_add(scroll, "EMPTY.TXT")
+    codex = disk.disk_optimize(disk.Disk(tmp_path / "old.img"), str(tmp_path / "new.img"))
+    assert sorted(e.full_name for e in codex.root_dir()) == ["EMPTY.TXT", "FILE0000.BIN"]
+    assert codex.check() == []
+
+
+def test_snapshot_lists_empty_files(tmp_path):
+    host = bench.prototype(tmp_path, 0xFD)
+    scroll = disk.empty_disk(host, str(tmp_path / "old.img"))
+    scroll.entry_add(bench.synthetic_entry(0, 10), [b"full".ljust(10)])
+    empty_add(scroll, "EMPTY.TXT")
+    snapshot = disk.Disk(tmp_path / "old.img").snapshot()
+    assert sorted(e.full_name for e in snapshot) == ["EMPTY.TXT", "FILE0000.BIN"]
+    assert snapshot["EMPTY.TXT"][1] == ()
+    assert snapshot.file_get("EMPTY.TXT") == snapshot.file_range("EMPTY.TXT", 0, 10) == b""
+
+
+def test_drive_read_only(tmp_path):
+    host = bench.prototype(tmp_path, 0xFD)
+    disk.empty_disk(host, str(tmp_path / "old.img"))
+    before = (tmp_path / "old.img").read_bytes()
+    drive = disk.Disk(tmp_path / "old.img").drive()
+    with pytest.raises(Exception, match="read-only"):
+        drive.write_sectors(0, 0, 5, b"x" * disk.Sector_sz)
+    drive.flush()
+    assert (tmp_path / "old.img").read_bytes() == before
+
+
+def test_drive_write(tmp_path):
+    host = bench.prototype(tmp_path, 0xFD)
+    disk.empty_disk(host, str(tmp_path / "old.img"))
+    scroll = disk.Disk(tmp_path / "old.img", read_only=False)
+    drive = scroll.drive()
+    assert scroll.drive() is drive
+    drive.write_sectors(0, 0, 5, b"")
+    drive.write_sectors(0, 1, 5, b"x")
+    drive.flush()
+    assert disk.Disk(tmp_path / "old.img").drive().read_sectors(0, 1, 5) == b"x" + b"\0" * (disk.Sector_sz - 1)